@@ -3,15 +3,27 @@ import threading
 import time
 from kivy.clock import Clock
 
+from change_notifier import change_notifier
+from refresh_scheduler import RefreshScheduler
+
 
 class AutoRefresher:
-    """Автоматическое обновление данных"""
+    """Автоматическое обновление данных по журналу изменений"""
+
+    # Интервал проверки базы: 1 с после изменений, до 60 с в тишине.
+    # Изменения из других экземпляров приходят через change_notifier,
+    # поэтому редкая проверка — только подстраховка
+    MIN_INTERVAL = 1
+    MAX_INTERVAL = 60
+    # Прежний опрос раз в 10 с — точка отсчёта для статистики
+    BASELINE_INTERVAL = 10
 
     def __init__(self, task_manager):
         self.task_manager = task_manager
         self.is_active = False
         self.refresh_thread = None
-        self.stop_event = threading.Event()
+        self.scheduler = RefreshScheduler('tasks', self.MIN_INTERVAL, self.MAX_INTERVAL,
+                                          baseline_interval=self.BASELINE_INTERVAL)
         self.ui_callback = None
 
     def set_ui_callback(self, callback):
@@ -24,7 +36,8 @@ class AutoRefresher:
             return
 
         self.is_active = True
-        self.stop_event.clear()
+        self.scheduler.start()
+        change_notifier.subscribe(self.task_manager.store.db_name, self.scheduler.wake)
 
         # Запускаем фоновый поток
         self.refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
@@ -38,7 +51,8 @@ class AutoRefresher:
             return
 
         self.is_active = False
-        self.stop_event.set()
+        change_notifier.unsubscribe(self.task_manager.store.db_name, self.scheduler.wake)
+        self.scheduler.stop()
 
         if self.refresh_thread:
             self.refresh_thread.join(timeout=2)
@@ -46,26 +60,54 @@ class AutoRefresher:
         print("⏹ Автообновление остановлено")
 
     def _refresh_loop(self):
-        """Цикл обновления в фоновом потоке"""
-        while not self.stop_event.is_set():
-            try:
-                # Ждем 10 секунд
-                for _ in range(10):
-                    if self.stop_event.is_set():
-                        return
-                    time.sleep(1)
-
-                # Обновляем данные
-                print("🔄 Автоматическое обновление...")
-                self.task_manager.refresh_all()
-
-                # Уведомляем UI
-                if self.ui_callback:
-                    Clock.schedule_once(lambda dt: self.ui_callback('both'), 0.1)
-
-            except Exception as e:
-                print(f"❌ Ошибка в цикле обновления: {e}")
-                time.sleep(5)
+        """Цикл обновления в фоновом потоке.
+
+        По расписанию планировщика проверяет PRAGMA data_version; если
+        база менялась, читает журнал изменений и обновляет только
+        затронутые вкладки. Без изменений UI не трогается, а интервал
+        проверки растёт.
+        """
+        store = self.task_manager.store
+        watch_conn = store.open_watch_connection()
+        last_seq = self.task_manager.last_change_seq()
+        data_version = store.data_version(watch_conn)
+
+        try:
+            while self.scheduler.wait():
+                try:
+                    current_version = store.data_version(watch_conn)
+                    if current_version == data_version:
+                        self.scheduler.report(False)
+                        continue
+                    data_version = current_version
+
+                    changes = self.task_manager.changes_since(last_seq)
+                    self.scheduler.report(bool(changes))
+                    if not changes:
+                        continue
+                    last_seq = changes[-1]['seq']
+
+                    # Обновляем данные
+                    print(f"🔄 Автоматическое обновление: изменений {len(changes)}")
+                    scope = self.task_manager.notify_changes(changes)
+
+                    # Уведомляем UI
+                    if scope and self.ui_callback:
+                        Clock.schedule_once(lambda dt, scope=scope: self.ui_callback(scope), 0.1)
+
+                except Exception as e:
+                    print(f"❌ Ошибка в цикле обновления: {e}")
+                    time.sleep(5)
+        finally:
+            watch_conn.close()
+
+    def notify_activity(self):
+        """Действие пользователя — вернуться к частым проверкам"""
+        self.scheduler.activity()
+
+    def get_stats(self):
+        """Статистика проверок планировщика"""
+        return self.scheduler.get_stats()
 
     def manual_refresh(self):
         """Ручное обновление"""
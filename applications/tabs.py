@@ -1,15 +1,13 @@
 # applications/tabs.py
 from kivy.uix.tabbedpanel import TabbedPanelItem
 from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle, RoundedRectangle
 import threading
 
-from applications.ui import TaskCard
+from applications.ui import TaskList
 from ui_style import palette, scale_dp, scale_font
 
 
@@ -24,6 +22,8 @@ class BaseTasksTab(TabbedPanelItem):
         self.last_refresh_time = 0
         self.notice_bar = None
         self.notice_event = None
+        self.scroll_view = None
+        self.tasks_layout = None
 
         # Основной контейнер
         self.content = BoxLayout(orientation='vertical')
@@ -72,6 +72,10 @@ class BaseTasksTab(TabbedPanelItem):
             return
 
         self.is_loading = True
+        if self.has_task_list():
+            # Список уже на экране — обновим его на месте, без мерцания
+            return
+
         self.content_container.clear_widgets()
 
         loading_layout = BoxLayout(orientation='vertical', padding=scale_dp(20))
@@ -89,10 +93,20 @@ class BaseTasksTab(TabbedPanelItem):
         """Скрыть индикатор загрузки"""
         self.is_loading = False
 
+    def has_task_list(self):
+        """Показан ли сейчас список задач"""
+        return self.scroll_view is not None and self.scroll_view.parent is self.content_container
+
+    def _clear_content(self):
+        """Очистить контейнер вместе со списком задач"""
+        self.content_container.clear_widgets()
+        self.scroll_view = None
+        self.tasks_layout = None
+
     def show_empty(self, message="Нет данных", font_size: float | None = None):
         """Показать сообщение об отсутствии данных"""
         self.hide_loading()
-        self.content_container.clear_widgets()
+        self._clear_content()
 
         empty_label = Label(
             text=message,
@@ -107,36 +121,111 @@ class BaseTasksTab(TabbedPanelItem):
     def show_tasks(self, tasks):
         """Показать список задач"""
         self.hide_loading()
-        self.content_container.clear_widgets()
 
         if not tasks:
             self.show_empty("Нет задач для отображения")
             return
 
-        # Создаем прокручиваемый контейнер
-        scroll_view = ScrollView(do_scroll_x=False)
-        tasks_layout = GridLayout(
-            cols=1,
-            size_hint_y=None,
-            spacing=scale_dp(5),
-            padding=[scale_dp(10), scale_dp(10), scale_dp(10), scale_dp(10)]
+        if self.has_task_list():
+            self._reconcile_tasks(tasks)
+            return
+
+        self._clear_content()
+
+        # Виртуализированный список: карточки создаются только для видимых строк
+        task_list = TaskList()
+        task_list.data = [self.task_view_data(task) for task in tasks]
+        self.content_container.add_widget(task_list)
+
+        self.scroll_view = task_list
+        self.tasks_layout = task_list.tasks_layout
+
+    def append_tasks(self, tasks):
+        """Дописать задачи в конец уже показанного списка"""
+        if not self.tasks_layout or not tasks:
+            return
+
+        restore_position = self._keep_scroll_position()
+        self.scroll_view.data.extend([self.task_view_data(task) for task in tasks])
+        Clock.schedule_once(restore_position)
+
+    def _keep_scroll_position(self):
+        """Запоминает, сколько пикселей прокручено от верха списка.
+
+        Возвращает колбэк, который после изменения данных возвращает список
+        в то же место, чтобы он не прыгал.
+        """
+        scroll_view = self.scroll_view
+        tasks_layout = self.tasks_layout
+        scrolled_from_top = (1 - scroll_view.scroll_y) * max(
+            tasks_layout.height - scroll_view.height, 0
+        )
+
+        def restore_position(dt):
+            scrollable = tasks_layout.height - scroll_view.height
+            if scrollable > 0:
+                scroll_view.scroll_y = min(1, max(0, 1 - scrolled_from_top / scrollable))
+
+        return restore_position
+
+    @staticmethod
+    def task_key(row):
+        """Ключ строки списка — id задачи"""
+        return row['task_data']['id']
+
+    def task_signature(self, row):
+        """Признаки строки, при изменении которых карточку надо перерисовать"""
+        task = row['task_data']
+        return (
+            task.get('version'),
+            task.get('status'),
+            task.get('is_assigned'),
+            task.get('user_task_status')
         )
-        tasks_layout.bind(minimum_height=tasks_layout.setter('height'))
+
+    def _reconcile_tasks(self, tasks):
+        """Обновить показанный список по новым данным, меняя только отличия.
+
+        Строки сопоставляются по id задачи за один проход: неизменные
+        (по версии строки) переходят в новый список теми же объектами,
+        изменившиеся и новые берутся из свежих данных. Список
+        присваивается один раз и только если что-то поменялось.
+        """
+        data = self.scroll_view.data
+        old_rows = {self.task_key(row): row for row in data}
+        rows = []
+        inserted = updated = 0
 
         for task in tasks:
-            card = self.create_task_card(task)
-            tasks_layout.add_widget(card)
-        scroll_view.add_widget(tasks_layout)
-        self.content_container.add_widget(scroll_view)
+            row = self.task_view_data(task)
+            old_row = old_rows.pop(self.task_key(row), None)
+            if old_row is None:
+                inserted += 1
+            elif self.task_signature(old_row) == self.task_signature(row):
+                row = old_row
+            else:
+                updated += 1
+            rows.append(row)
+
+        # Что осталось в old_rows — задачи, которых больше нет
+        removed = len(old_rows)
+        changed = len(rows) != len(data) or any(new is not old for new, old in zip(rows, data))
+        if not changed:
+            return
+
+        restore_position = self._keep_scroll_position()
+        self.scroll_view.data = rows
+        print(f"🔁 {self.text}: -{removed} +{inserted} ~{updated}")
+        Clock.schedule_once(restore_position)
 
-    def create_task_card(self, task):
-        """Создать карточку задачи (переопределить)"""
-        return Label(text=f"Задача: {task.get('id', '?')}")
+    def task_view_data(self, task):
+        """Данные строки списка для карточки задачи (переопределить)"""
+        return {'task_data': task, 'on_view': self.view_task}
 
     def show_error(self, message="Ошибка загрузки"):
         """Показать сообщение об ошибке"""
         self.hide_loading()
-        self.content_container.clear_widgets()
+        self._clear_content()
 
         error_layout = BoxLayout(orientation='vertical', spacing=scale_dp(10), padding=scale_dp(20))
 
@@ -323,9 +412,17 @@ class BaseTasksTab(TabbedPanelItem):
 class AllTasksTab(BaseTasksTab):
     """Вкладка "Все задачи" с динамическим обновлением"""
 
+    PAGE_SIZE = 50
+    # Доля прокрутки до низа списка, при которой подгружается следующая страница
+    LOAD_MORE_THRESHOLD = 0.1
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.selected_department = None
+        self.next_cursor = None
+        self.has_more = False
+        self.is_loading_more = False
+        self.refresh_limit = self.PAGE_SIZE
         self.setup_ui()
         Clock.schedule_once(lambda dt: self.refresh(), 0.5)
 
@@ -401,13 +498,23 @@ class AllTasksTab(BaseTasksTab):
             self.department_label.text = "Укажите отдел в профиле"
             self.show_empty("Заполните отдел в профиле", font_size=18)
             return
+        # Перезагружаем столько строк, сколько уже подгружено, чтобы
+        # обновление на месте не обрезало прокрученные страницы
+        limit = self.PAGE_SIZE
+        if self.has_task_list():
+            limit = max(limit, len(self.scroll_view.data))
+
         self.show_loading()
+        self.next_cursor = None
+        self.has_more = False
+        self.refresh_limit = limit
 
         def load_tasks():
             try:
                 tasks = self.task_manager.get_all_tasks(
                     force_refresh=force,
-                    department=self.selected_department
+                    department=self.selected_department,
+                    limit=limit
                 )
                 Clock.schedule_once(lambda dt: self._display_tasks(tasks))
             except Exception as e:
@@ -424,18 +531,68 @@ class AllTasksTab(BaseTasksTab):
             self.show_empty("Нет доступных задач")
             return
 
+        reused = self.has_task_list()
+        self._remember_page(tasks, len(tasks) >= self.refresh_limit)
         self.show_tasks(tasks)
+        if not reused:
+            self.scroll_view.bind(scroll_y=self._on_scroll)
+
+    def _remember_page(self, tasks, has_more):
+        """Запомнить курсор для следующей страницы"""
+        self.has_more = has_more
+        last = tasks[-1]
+        self.next_cursor = (last['created_date'], last['id'])
+
+    def _on_scroll(self, instance, scroll_y):
+        """Подгрузка следующей страницы у нижнего края списка"""
+        if scroll_y <= self.LOAD_MORE_THRESHOLD and self.has_more and not self.is_loading_more:
+            self.load_more()
+
+    def load_more(self):
+        """Загрузка следующей страницы задач"""
+        self.is_loading_more = True
+        after = self.next_cursor
+
+        def load_page():
+            try:
+                tasks = self.task_manager.get_all_tasks(
+                    department=self.selected_department,
+                    after=after,
+                    limit=self.PAGE_SIZE
+                )
+                Clock.schedule_once(lambda dt: self._append_page(tasks, after))
+            except Exception as e:
+                print(f"❌ Ошибка при загрузке страницы задач: {e}")
+                self.is_loading_more = False
+
+        threading.Thread(target=load_page, daemon=True).start()
+
+    def _append_page(self, tasks, after):
+        """Добавление загруженной страницы в список"""
+        self.is_loading_more = False
 
-    def create_task_card(self, task):
-        """Создать карточку задачи"""
+        # Пока страница грузилась, список успели перезагрузить
+        if after != self.next_cursor:
+            return
+
+        if not tasks:
+            self.has_more = False
+            return
+
+        print(f"📊 Подгружено ещё {len(tasks)} задач")
+        self._remember_page(tasks, len(tasks) >= self.PAGE_SIZE)
+        self.append_tasks(tasks)
+
+    def task_view_data(self, task):
+        """Данные строки списка для карточки задачи"""
         is_assigned = task.get('is_assigned', 0) == 1
 
-        return TaskCard(
-            task_data=task,
-            show_accept=not is_assigned,
-            on_accept=self.accept_task,
-            on_view=self.view_task  # Теперь этот метод есть в базовом классе
-        )
+        return {
+            'task_data': task,
+            'show_accept': not is_assigned,
+            'on_accept': self.accept_task,
+            'on_view': self.view_task
+        }
 
     def accept_task(self, task_id):
         """Принятие задачи"""
@@ -444,6 +601,10 @@ class AllTasksTab(BaseTasksTab):
         if not self.task_manager:
             return
 
+        # После действия пользователя изменения вероятнее — проверяем чаще
+        if self.auto_refresher:
+            self.auto_refresher.notify_activity()
+
         def assign_task():
             try:
                 success = self.task_manager.assign_task(task_id)
@@ -526,15 +687,15 @@ class MyTasksTab(BaseTasksTab):
 
         self.show_tasks(tasks)
 
-    def create_task_card(self, task):
-        """Создать карточку задачи пользователя"""
-        return TaskCard(
-            task_data=task,
-            show_accept=False,
-            show_complete=True,
-            on_view=self.view_task,
-            on_complete=self.complete_task
-        )
+    def task_view_data(self, task):
+        """Данные строки списка для карточки задачи пользователя"""
+        return {
+            'task_data': task,
+            'show_accept': False,
+            'show_complete': True,
+            'on_view': self.view_task,
+            'on_complete': self.complete_task
+        }
 
     def complete_task(self, task_id):
         """Завершение задачи"""
@@ -543,6 +704,10 @@ class MyTasksTab(BaseTasksTab):
         if not self.task_manager:
             return
 
+        # После действия пользователя изменения вероятнее — проверяем чаще
+        if self.auto_refresher:
+            self.auto_refresher.notify_activity()
+
         def complete():
             try:
                 success = self.task_manager.complete_task(task_id)
@@ -1,19 +1,19 @@
 # applications/task_manager.py
-import sqlite3
 import time
-from typing import List, Dict, Callable
-from applications.assigned_tasks_db import AssignedTasksDB
+from typing import List, Dict, Callable, Tuple
+from change_notifier import change_notifier
+from applications.task_store import TaskStore
 from applications.user_manager import UserManager
 
 
 class TaskManager:
     """Менеджер задач с поддержкой событий"""
 
-    def __init__(self):
+    def __init__(self, db_name='applications.db'):
         self.user_manager = UserManager()
         self.current_user = None
-        self.assigned_db = AssignedTasksDB()
-        self._initialize_tables()
+        # Заявки и назначения хранятся в одной базе
+        self.store = TaskStore(db_name)
 
         # Система событий
         self.listeners = {
@@ -56,52 +56,12 @@ class TaskManager:
 
         self._notify_listeners('user_changed')
 
-    def _initialize_tables(self):
-        """Инициализация таблиц"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # Создаём таблицу, если её ещё нет
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS applications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                department TEXT NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT NOT NULL,
-                days INTEGER NOT NULL,
-                difficulty INTEGER DEFAULT 1,
-                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'new'
-            )
-        ''')
-
-        # Гарантируем наличие служебных колонок для назначения и завершения задач
-        existing_columns = {
-            column[1] for column in cursor.execute('PRAGMA table_info(applications)').fetchall()
-        }
-
-        required_columns = {
-            'difficulty': 'INTEGER DEFAULT 1',
-            'assigned_to': 'TEXT',
-            'assigned_date': 'TIMESTAMP',
-            'completed_date': 'TIMESTAMP'
-        }
-
-        for column_name, column_type in required_columns.items():
-            if column_name not in existing_columns:
-                cursor.execute(f'ALTER TABLE applications ADD COLUMN {column_name} {column_type}')
-
-        conn.commit()
-        conn.close()
-
-    def _get_connection(self):
-        """Получение соединения с БД"""
-        return sqlite3.connect('applications.db')
-
-    def get_all_tasks(self, force_refresh: bool = False, department: str | None = None) -> List[Dict]:
+    def get_all_tasks(self, force_refresh: bool = False, department: str | None = None,
+                      after: Tuple | None = None, limit: int | None = None) -> List[Dict]:
         """Получение всех задач строго по отделу пользователя.
 
         department параметр игнорируется — отдел берётся из профиля текущего пользователя.
+        after=(created_date, id) и limit задают страницу: задачи после курсора.
         """
         if not self.current_user:
             return []
@@ -110,38 +70,13 @@ class TaskManager:
         if not user_department:
             return []
 
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
         try:
-            query = '''
-                SELECT * FROM applications
-                WHERE (status = 'new' OR status IS NULL OR status = '')
-                  AND department = ?
-                ORDER BY created_date DESC
-            '''
-
-            cursor.execute(query, [user_department])
-
-            tasks = []
-            for row in cursor.fetchall():
-                task = dict(row)
-                task_id = task['id']
-
-                # Проверяем, назначена ли задача
-                is_assigned = self.assigned_db.is_task_assigned(task_id)
-                task['is_assigned'] = 1 if is_assigned else 0
-
-                tasks.append(task)
-
-            return tasks
+            # Признак назначения вычисляется в том же запросе
+            return self.store.get_open_tasks(user_department, after=after, limit=limit)
 
         except Exception as e:
             print(f"Ошибка: {e}")
             return []
-        finally:
-            conn.close()
 
     def get_user_tasks(self, force_refresh: bool = False) -> List[Dict]:
         """Получение задач пользователя"""
@@ -151,44 +86,8 @@ class TaskManager:
         user_id = self.current_user['uid']
 
         try:
-            # Получаем назначенные задачи
-            assigned_tasks = self.assigned_db.get_user_tasks(user_id)
-
-            if not assigned_tasks:
-                return []
-
-            # Получаем детали задач
-            conn = self._get_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            task_ids = [task['task_id'] for task in assigned_tasks]
-            placeholders = ','.join('?' for _ in task_ids)
-
-            cursor.execute(f'''
-                SELECT * FROM applications 
-                WHERE id IN ({placeholders})
-                ORDER BY created_date DESC
-            ''', task_ids)
-
-            tasks = []
-            for db_task in cursor.fetchall():
-                task = dict(db_task)
-                task_id = task['id']
-
-                # Находим информацию о назначении
-                assigned_info = next(
-                    (at for at in assigned_tasks if at['task_id'] == task_id),
-                    None
-                )
-
-                if assigned_info:
-                    task['accepted_date'] = assigned_info.get('accepted_date')
-                    task['user_task_status'] = assigned_info.get('status', 'in_progress')
-                    tasks.append(task)
-
-            conn.close()
-            return tasks
+            # Задачи и данные назначения одним запросом
+            return self.store.get_user_tasks(user_id)
 
         except Exception as e:
             print(f"Ошибка: {e}")
@@ -203,28 +102,12 @@ class TaskManager:
         user_email = self.current_user.get('email', '')
 
         try:
-            # Назначаем задачу
-            assigned_success = self.assigned_db.assign_task(user_id, task_id)
-
-            if not assigned_success:
+            # Назначение и обновление статуса — одна транзакция
+            if not self.store.assign_task(user_id, user_email, task_id):
                 return False
 
-            # Обновляем статус
-            conn = self._get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE applications 
-                SET status = 'assigned', 
-                    assigned_to = ?,
-                    assigned_date = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (user_email, task_id))
-
-            conn.commit()
-            conn.close()
-
-            # Уведомляем об изменении
+            # Уведомляем об изменении (и другие экземпляры приложения)
+            change_notifier.bump(self.store.db_name)
             self._notify_listeners('tasks_changed')
             self._notify_listeners('user_tasks_changed')
 
@@ -233,11 +116,6 @@ class TaskManager:
 
         except Exception as e:
             print(f"Ошибка: {e}")
-            # Откат назначения при ошибке обновления основной таблицы
-            try:
-                self.assigned_db.remove_assignment(task_id)
-            except Exception as cleanup_error:
-                print(f"Не удалось откатить назначение задачи {task_id}: {cleanup_error}")
             return False
 
     def complete_task(self, task_id: int) -> bool:
@@ -248,27 +126,12 @@ class TaskManager:
         user_id = self.current_user['uid']
 
         try:
-            # Завершаем задачу
-            success = self.assigned_db.complete_task(user_id, task_id)
-
-            if not success:
+            # Завершение и обновление статуса — одна транзакция
+            if not self.store.complete_task(user_id, task_id):
                 return False
 
-            # Обновляем статус
-            conn = self._get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE applications 
-                SET status = 'completed',
-                    completed_date = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (task_id,))
-
-            conn.commit()
-            conn.close()
-
-            # Уведомляем об изменении
+            # Уведомляем об изменении (и другие экземпляры приложения)
+            change_notifier.bump(self.store.db_name)
             self._notify_listeners('tasks_changed')
             self._notify_listeners('user_tasks_changed')
 
@@ -281,21 +144,59 @@ class TaskManager:
 
     def get_task_details(self, task_id: int) -> Dict:
         """Получение деталей задачи"""
-        conn = self._get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
         try:
-            cursor.execute('SELECT * FROM applications WHERE id = ?', (task_id,))
-            task = cursor.fetchone()
-
-            if task:
-                return dict(task)
-            return {}
+            return self.store.get_task(task_id) or {}
         except:
             return {}
-        finally:
-            conn.close()
+
+    def last_change_seq(self) -> int:
+        """Номер последнего изменения в журнале задач"""
+        return self.store.last_change_seq()
+
+    def changes_since(self, seq: int) -> List[Dict]:
+        """Все изменения задач и назначений после seq.
+
+        Журнал читается страницами, пока не придёт неполная: после
+        всплеска записей повторной смены data_version может не быть.
+        """
+        changes = []
+        page_size = self.store.CHANGES_PAGE_SIZE
+        while True:
+            page = self.store.changes_since(seq, page_size)
+            changes.extend(page)
+            if len(page) < page_size:
+                return changes
+            seq = page[-1]['seq']
+
+    def notify_changes(self, changes: List[Dict]) -> str | None:
+        """Уведомление слушателей по записям журнала.
+
+        Возвращает, какие вкладки затронуты: 'all', 'user', 'both' или None.
+        """
+        tasks_changed = False
+        user_tasks_changed = False
+
+        for change in changes:
+            if change['table_name'] == 'assigned_tasks':
+                user_tasks_changed = True
+            else:
+                tasks_changed = True
+                # Изменение самой заявки видно и во вкладке «Мои задачи»
+                if change['op'] != 'insert':
+                    user_tasks_changed = True
+
+        if tasks_changed:
+            self._notify_listeners('tasks_changed')
+        if user_tasks_changed:
+            self._notify_listeners('user_tasks_changed')
+
+        if tasks_changed and user_tasks_changed:
+            return 'both'
+        if tasks_changed:
+            return 'all'
+        if user_tasks_changed:
+            return 'user'
+        return None
 
     def refresh_all(self):
         """Принудительное обновление всех данных"""
@@ -0,0 +1,477 @@
+# applications/task_store.py
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from connection_manager import connection_manager
+
+
+class TaskStore:
+    """Хранилище задач: заявки и их назначения в одной базе applications.db.
+
+    Назначение и завершение задачи меняют обе таблицы в одной транзакции.
+    """
+
+    MAX_QUERY_PARAMS = 500
+    # Сколько последних изменений хранить в журнале
+    CHANGE_JOURNAL_SIZE = 10000
+    # Сколько записей журнала читать за один запрос
+    CHANGES_PAGE_SIZE = 1000
+
+    def __init__(self, db_name='applications.db', legacy_assigned_db='assigned_tasks.db'):
+        self.db_name = db_name
+        # Отдельная база назначений из прошлых версий, данные из неё переносятся
+        self.legacy_assigned_db = legacy_assigned_db
+        self._init_database()
+
+    def _get_connection(self):
+        """Получение соединения с БД из общего пула (используется в with)"""
+        return connection_manager.connection(self.db_name)
+
+    def _init_database(self):
+        """Инициализация таблиц и миграций"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            self._create_tables(cursor)
+            conn.commit()
+            self._migrate(conn)
+
+        print(f"Хранилище задач {self.db_name} инициализировано")
+
+    def _create_tables(self, cursor):
+        """Создание таблиц заявок и назначений"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS applications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                department TEXT NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                days INTEGER NOT NULL,
+                difficulty INTEGER DEFAULT 1,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'new'
+            )
+        ''')
+
+        # Гарантируем наличие служебных колонок для назначения и завершения задач
+        existing_columns = {
+            column[1] for column in cursor.execute('PRAGMA table_info(applications)').fetchall()
+        }
+
+        required_columns = {
+            'difficulty': 'INTEGER DEFAULT 1',
+            'assigned_to': 'TEXT',
+            'assigned_date': 'TIMESTAMP',
+            'completed_date': 'TIMESTAMP'
+        }
+
+        for column_name, column_type in required_columns.items():
+            if column_name not in existing_columns:
+                cursor.execute(f'ALTER TABLE applications ADD COLUMN {column_name} {column_type}')
+
+        # Таблица назначенных задач
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS assigned_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                task_id INTEGER NOT NULL,
+                accepted_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'in_progress',
+                UNIQUE(user_id, task_id)
+            )
+        ''')
+
+        # Индекс для быстрого поиска по task_id
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_task_id
+            ON assigned_tasks(task_id)
+        ''')
+
+    # ---------- Миграции ----------
+
+    def _migrate(self, conn):
+        """Применяет миграции, номер последней хранится в PRAGMA user_version"""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        for number, migration in enumerate(self.MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            migration(self, conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+            print(f"Миграция {number} ({migration.__name__}) применена")
+
+    def _migration_import_assigned_tasks(self, conn):
+        """Переносит назначения из отдельной базы assigned_tasks.db"""
+        if not self.legacy_assigned_db or not os.path.exists(self.legacy_assigned_db):
+            return
+
+        conn.execute('ATTACH DATABASE ? AS legacy', (self.legacy_assigned_db,))
+        try:
+            has_table = conn.execute('''
+                SELECT 1 FROM legacy.sqlite_master
+                WHERE type = 'table' AND name = 'assigned_tasks'
+            ''').fetchone()
+
+            if has_table:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO assigned_tasks (user_id, task_id, accepted_date, status)
+                    SELECT user_id, task_id, accepted_date, status
+                    FROM legacy.assigned_tasks
+                ''')
+                print(f"Перенесено назначений из {self.legacy_assigned_db}: {cursor.rowcount}")
+            conn.commit()
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute('DETACH DATABASE legacy')
+
+    def _migration_task_feed_indexes(self, conn):
+        """Индексы под запросы ленты задач и нормализация статуса"""
+        # Пустой статус означает новую задачу: приводим к 'new', чтобы
+        # фильтр был одним равенством и мог использовать частичный индекс
+        conn.execute('''
+            UPDATE applications SET status = 'new'
+            WHERE status IS NULL OR status = ''
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_status_default
+            AFTER INSERT ON applications
+            WHEN NEW.status IS NULL OR NEW.status = ''
+            BEGIN
+                UPDATE applications SET status = 'new' WHERE id = NEW.id;
+            END
+        ''')
+
+        # Лента отдела: только новые задачи, уже отсортированные по дате
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applications_open_feed
+            ON applications(department, created_date DESC)
+            WHERE status = 'new'
+        ''')
+        # Общий список заявок (RequestDatabase.get_all_requests)
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applications_created
+            ON applications(created_date)
+        ''')
+
+        # Поиск назначений по user_id уже покрывает UNIQUE(user_id, task_id)
+        conn.execute('DROP INDEX IF EXISTS idx_user_id')
+        conn.commit()
+
+    def _migration_task_feed_keyset_index(self, conn):
+        """Индекс ленты под постраничную выборку по (created_date, id)"""
+        # Возрастающий индекс читается в обратном порядке: created_date DESC,
+        # id DESC без сортировки, а курсор задаёт начало диапазона
+        conn.execute('DROP INDEX IF EXISTS idx_applications_open_feed')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applications_open_feed
+            ON applications(department, created_date)
+            WHERE status = 'new'
+        ''')
+        conn.commit()
+
+    def _migration_row_version(self, conn):
+        """Версия строки заявки: растёт при каждом изменении"""
+        existing_columns = {
+            column[1] for column in conn.execute('PRAGMA table_info(applications)').fetchall()
+        }
+        if 'version' not in existing_columns:
+            conn.execute('ALTER TABLE applications ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+        # По версии список задач понимает, какие карточки надо перерисовать
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_version
+            AFTER UPDATE ON applications
+            WHEN NEW.version = OLD.version
+            BEGIN
+                UPDATE applications SET version = OLD.version + 1 WHERE id = NEW.id;
+            END
+        ''')
+        conn.commit()
+
+    def _migration_change_journal(self, conn):
+        """Журнал изменений заявок и назначений, заполняемый триггерами"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS applications_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                task_id INTEGER NOT NULL,
+                op TEXT NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Каждое изменение заявки проходит через триггер версии, поэтому
+        # обновление журналируется один раз — когда версия выросла
+        conn.executescript(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applications_journal_insert
+            AFTER INSERT ON applications
+            BEGIN
+                INSERT INTO applications_changes (table_name, task_id, op)
+                VALUES ('applications', NEW.id, 'insert');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_applications_journal_update
+            AFTER UPDATE ON applications
+            WHEN NEW.version != OLD.version
+            BEGIN
+                INSERT INTO applications_changes (table_name, task_id, op)
+                VALUES ('applications', NEW.id, 'update');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_applications_journal_delete
+            AFTER DELETE ON applications
+            BEGIN
+                INSERT INTO applications_changes (table_name, task_id, op)
+                VALUES ('applications', OLD.id, 'delete');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_assigned_journal_insert
+            AFTER INSERT ON assigned_tasks
+            BEGIN
+                INSERT INTO applications_changes (table_name, task_id, op)
+                VALUES ('assigned_tasks', NEW.task_id, 'insert');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_assigned_journal_update
+            AFTER UPDATE ON assigned_tasks
+            BEGIN
+                INSERT INTO applications_changes (table_name, task_id, op)
+                VALUES ('assigned_tasks', NEW.task_id, 'update');
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_assigned_journal_delete
+            AFTER DELETE ON assigned_tasks
+            BEGIN
+                INSERT INTO applications_changes (table_name, task_id, op)
+                VALUES ('assigned_tasks', OLD.task_id, 'delete');
+            END;
+
+            -- Журнал нужен только для недавних изменений, старые записи удаляются
+            CREATE TRIGGER IF NOT EXISTS trg_applications_changes_trim
+            AFTER INSERT ON applications_changes
+            BEGIN
+                DELETE FROM applications_changes WHERE seq <= NEW.seq - {self.CHANGE_JOURNAL_SIZE};
+            END;
+        ''')
+        conn.commit()
+
+    MIGRATIONS = [
+        _migration_import_assigned_tasks,
+        _migration_task_feed_indexes,
+        _migration_task_feed_keyset_index,
+        _migration_row_version,
+        _migration_change_journal,
+    ]
+
+    # ---------- Чтение ----------
+
+    def get_open_tasks(self, department: str, after: Optional[Tuple] = None,
+                       limit: Optional[int] = None) -> List[Dict]:
+        """Открытые задачи отдела вместе с признаком назначения.
+
+        after — курсор (created_date, id) последней полученной задачи:
+        возвращаются задачи строго после него в порядке ленты.
+        """
+        query, params = self._open_tasks_query(department, after, limit)
+
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _open_tasks_query(department: str, after: Optional[Tuple] = None,
+                          limit: Optional[int] = None) -> Tuple[str, List]:
+        """Запрос ленты открытых задач (план проверяется в tests/test_task_store.py)"""
+        conditions = ["a.status = 'new'", 'a.department = ?']
+        params = [department]
+
+        if after is not None:
+            conditions.append('(a.created_date, a.id) < (?, ?)')
+            params.extend(after)
+
+        query = f'''
+            SELECT a.*,
+                   EXISTS(SELECT 1 FROM assigned_tasks t WHERE t.task_id = a.id) AS is_assigned
+            FROM applications a
+            WHERE {' AND '.join(conditions)}
+            ORDER BY a.created_date DESC, a.id DESC
+        '''
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return query, params
+
+    def get_user_tasks(self, user_id: str) -> List[Dict]:
+        """Незавершённые задачи пользователя вместе с данными назначения"""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute('''
+                SELECT a.*,
+                       t.accepted_date,
+                       COALESCE(t.status, 'in_progress') AS user_task_status
+                FROM assigned_tasks t
+                JOIN applications a ON a.id = t.task_id
+                WHERE t.user_id = ? AND t.status != 'completed'
+                ORDER BY a.created_date DESC
+            ''', (user_id,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_task(self, task_id: int) -> Optional[Dict]:
+        """Заявка по id"""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            task = conn.execute('SELECT * FROM applications WHERE id = ?', (task_id,)).fetchone()
+            return dict(task) if task else None
+
+    def is_task_assigned(self, task_id: int) -> bool:
+        """Проверка, назначена ли задача"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.execute('SELECT 1 FROM assigned_tasks WHERE task_id = ?', (task_id,))
+                return cursor.fetchone() is not None
+
+        except Exception as e:
+            print(f"Ошибка при проверке задачи: {e}")
+            return False
+
+    def get_assigned_task_ids(self, task_ids) -> set:
+        """Пакетная проверка: какие из переданных задач уже назначены"""
+        task_ids = list(task_ids)
+        assigned = set()
+        if not task_ids:
+            return assigned
+
+        try:
+            with self._get_connection() as conn:
+                # Ограничение SQLite на число параметров в одном запросе
+                for start in range(0, len(task_ids), self.MAX_QUERY_PARAMS):
+                    chunk = task_ids[start:start + self.MAX_QUERY_PARAMS]
+                    placeholders = ','.join('?' for _ in chunk)
+                    cursor = conn.execute(
+                        f'SELECT DISTINCT task_id FROM assigned_tasks WHERE task_id IN ({placeholders})',
+                        chunk
+                    )
+                    assigned.update(row[0] for row in cursor.fetchall())
+            return assigned
+
+        except Exception as e:
+            print(f"Ошибка при проверке задач: {e}")
+            return set()
+
+    def get_all_assigned_tasks(self) -> list:
+        """Получение всех назначенных задач"""
+        try:
+            with self._get_connection() as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute('SELECT * FROM assigned_tasks ORDER BY accepted_date DESC')
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            print(f"Ошибка при получении всех назначенных задач: {e}")
+            return []
+
+    # ---------- Журнал изменений ----------
+
+    def last_change_seq(self) -> int:
+        """Номер последнего изменения в журнале (0, если журнал пуст)"""
+        with self._get_connection() as conn:
+            row = conn.execute('SELECT MAX(seq) FROM applications_changes').fetchone()
+            return row[0] or 0
+
+    def changes_since(self, seq: int, limit: int = CHANGES_PAGE_SIZE) -> List[Dict]:
+        """Страница изменений с номером больше seq в порядке возрастания"""
+        with self._get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute('''
+                SELECT seq, table_name, task_id, op, changed_at
+                FROM applications_changes
+                WHERE seq > ?
+                ORDER BY seq
+                LIMIT ?
+            ''', (seq, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def open_watch_connection(self):
+        """Отдельное соединение для слежения за PRAGMA data_version.
+
+        data_version меняется, когда коммитит любое другое соединение
+        (в том числе из другого процесса), поэтому соединение не берётся
+        из пула и ничего не пишет. Закрывает его вызывающий.
+        """
+        return connection_manager.connect(self.db_name)
+
+    @staticmethod
+    def data_version(conn) -> int:
+        """Текущее значение PRAGMA data_version для соединения-наблюдателя"""
+        return conn.execute('PRAGMA data_version').fetchone()[0]
+
+    # ---------- Запись ----------
+
+    def assign_task(self, user_id: str, user_email: str, task_id: int) -> bool:
+        """Назначение задачи пользователю (одна транзакция на обе таблицы)"""
+        with self._get_connection() as conn:
+            # Сразу берём блокировку на запись, чтобы проверка и вставка были атомарны
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+
+            # Проверяем, не назначена ли уже задача
+            cursor.execute('SELECT user_id FROM assigned_tasks WHERE task_id = ?', (task_id,))
+            existing = cursor.fetchone()
+            if existing and existing[0] != user_id:
+                print(f"Задача {task_id} уже назначена пользователю {existing[0]}")
+                return False
+
+            if not existing:
+                cursor.execute('''
+                    INSERT INTO assigned_tasks (user_id, task_id, status)
+                    VALUES (?, ?, 'in_progress')
+                ''', (user_id, task_id))
+
+            cursor.execute('''
+                UPDATE applications
+                SET status = 'assigned',
+                    assigned_to = ?,
+                    assigned_date = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (user_email, task_id))
+
+        print(f"Задача {task_id} назначена пользователю {user_id}")
+        return True
+
+    def complete_task(self, user_id: str, task_id: int) -> bool:
+        """Завершение задачи (одна транзакция на обе таблицы)"""
+        with self._get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+
+            # Завершить можно только свою задачу в работе
+            cursor.execute('''
+                UPDATE assigned_tasks
+                SET status = 'completed'
+                WHERE task_id = ? AND user_id = ? AND status = 'in_progress'
+            ''', (task_id, user_id))
+
+            if cursor.rowcount == 0:
+                return False
+
+            cursor.execute('''
+                UPDATE applications
+                SET status = 'completed',
+                    completed_date = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (task_id,))
+
+        return True
+
+    def remove_assignment(self, task_id: int) -> bool:
+        """Удаление записи о назначении задачи"""
+        try:
+            with self._get_connection() as conn:
+                conn.execute('DELETE FROM assigned_tasks WHERE task_id = ?', (task_id,))
+            return True
+        except Exception as e:
+            print(f"Ошибка при удалении назначения задачи: {e}")
+            return False
@@ -2,38 +2,50 @@
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.graphics import Color, Line, RoundedRectangle
 from ui_style import palette, scale_dp, scale_font
 from send.difficulty_predictor import format_difficulty
 
 
-class TaskCard(BoxLayout):
-    """Карточка задачи"""
+class TaskCard(RecycleDataViewBehavior, BoxLayout):
+    """Карточка задачи.
 
-    def __init__(self, task_data, show_accept=True, show_complete=False,
-                 on_accept=None, on_view=None, on_complete=None, **kwargs):
+    Создаётся списком TaskList один раз и переиспользуется для разных задач:
+    при прокрутке в неё подставляются данные через refresh_view_attrs.
+    """
+
+    TITLE_HEIGHT = 50
+    DESC_HEIGHT = 56
+    INFO_HEIGHT = 30
+    BUTTONS_HEIGHT = 32
+    PADDING = 8
+    SPACING = 4
+
+    @classmethod
+    def card_height(cls):
+        """Фиксированная высота карточки (нужна списку заранее)"""
+        content = cls.TITLE_HEIGHT + cls.DESC_HEIGHT + cls.INFO_HEIGHT + cls.BUTTONS_HEIGHT
+        return scale_dp(content + cls.PADDING * 2 + cls.SPACING * 3)
+
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.task_data = task_data
-        self.on_accept = on_accept
-        self.on_view = on_view
-        self.on_complete = on_complete
+        self.task_data = {}
+        self.on_accept = None
+        self.on_view = None
+        self.on_complete = None
 
         self.orientation = 'vertical'
         self.size_hint_y = None
-        self.padding = scale_dp(8)
-        self.spacing = scale_dp(4)
-        self.bind(minimum_height=self.setter('height'))
+        self.height = self.card_height()
+        self.padding = scale_dp(self.PADDING)
+        self.spacing = scale_dp(self.SPACING)
 
-        # Фон карточки
+        # Фон карточки (цвет зависит от статуса и меняется при переиспользовании)
         with self.canvas.before:
-            status = task_data.get('status', 'new')
-            if status == 'completed':
-                Color(*palette['success'])
-            elif status == 'assigned':
-                Color(*palette['accent_muted'])
-            else:
-                Color(*palette['surface_alt'])
-
+            self.bg_color = Color(*palette['surface_alt'])
             self.bg_rect = RoundedRectangle(
                 pos=self.pos,
                 size=self.size,
@@ -52,98 +64,78 @@ class TaskCard(BoxLayout):
                 ],
                 width=scale_dp(1)
             )
-            
+
         self.bind(pos=self._update_bg, size=self._update_bg)
 
         # Заголовок
-        title_row = BoxLayout(size_hint_y=None)
-        title_row.bind(minimum_height=title_row.setter('height'))
+        title_row = BoxLayout(size_hint_y=None, height=scale_dp(self.TITLE_HEIGHT))
 
-        title_label = Label(
-            text=task_data.get('title', ''),
+        self.title_label = Label(
             color=palette['text_primary'],
             font_size=scale_font(39),
             bold=True,
             halign='left',
             valign='top',
             size_hint_x=0.7,
-            size_hint_y=None
-        )
-        title_label.bind(
-            width=lambda instance, value: setattr(instance, 'text_size', (value, None)),
-            texture_size=lambda instance, value: setattr(instance, 'height', max(value[1], scale_dp(50)))
+            shorten=True,
+            shorten_from='right'
         )
+        self.title_label.bind(size=self.title_label.setter('text_size'))
 
-        dept_label = Label(
-            text=task_data['department'][:15],
+        self.dept_label = Label(
             color=palette['text_muted'],
             font_size=scale_font(26),
             size_hint_x=0.3,
             halign='right',
-            valign='top',
-            size_hint_y=None
-        )
-        dept_label.bind(
-            width=lambda instance, value: setattr(instance, 'text_size', (value, None)),
-            texture_size=lambda instance, value: setattr(instance, 'height', max(value[1], scale_dp(28)))
+            valign='top'
         )
+        self.dept_label.bind(size=self.dept_label.setter('text_size'))
 
-        title_row.add_widget(title_label)
-        title_row.add_widget(dept_label)
+        title_row.add_widget(self.title_label)
+        title_row.add_widget(self.dept_label)
         self.add_widget(title_row)
 
-        # Описание
-        desc_label = Label(
-            text=task_data.get('description', ''),
+        # Описание (полный текст — в окне «Подробнее»)
+        self.desc_label = Label(
             color=palette['text_muted'],
             font_size=scale_font(30),
             size_hint_y=None,
+            height=scale_dp(self.DESC_HEIGHT),
             halign='left',
-            valign='top'
-        )
-        desc_label.bind(
-            width=lambda instance, value: setattr(instance, 'text_size', (value, None)),
-            texture_size=lambda instance, value: setattr(instance, 'height', max(value[1], scale_dp(40)))
+            valign='top',
+            max_lines=2
         )
-        self.add_widget(desc_label)
+        self.desc_label.bind(width=lambda instance, value: setattr(instance, 'text_size', (value, None)))
+        self.add_widget(self.desc_label)
 
-        # Информация и кнопки
-        info_row = BoxLayout(size_hint_y=None, height=scale_dp(30), spacing=scale_dp(5))
+        # Информация
+        info_row = BoxLayout(size_hint_y=None, height=scale_dp(self.INFO_HEIGHT), spacing=scale_dp(5))
 
         # Дни
-        days_label = Label(
-            text=f"Дней на выполнение: {task_data['days']}",
+        self.days_label = Label(
             color=palette['text_primary'],
             font_size=scale_font(24),
             size_hint_x=0.32,
             halign='left'
         )
-        days_label.bind(size=days_label.setter('text_size'))
-        info_row.add_widget(days_label)
+        self.days_label.bind(size=self.days_label.setter('text_size'))
+        info_row.add_widget(self.days_label)
 
         # Сложность
-        raw_difficulty = task_data.get('difficulty', 1)
-        try:
-            difficulty_value = int(raw_difficulty)
-        except (TypeError, ValueError):
-            difficulty_value = 1
-        difficulty_label = Label(
-            text=f"Сложность: {format_difficulty(difficulty_value)}",
+        self.difficulty_label = Label(
             color=palette['text_primary'],
             font_size=scale_font(24),
             size_hint_x=0.28,
             halign='left'
         )
-        difficulty_label.bind(size=difficulty_label.setter('text_size'))
-        info_row.add_widget(difficulty_label)
+        self.difficulty_label.bind(size=self.difficulty_label.setter('text_size'))
+        info_row.add_widget(self.difficulty_label)
 
         self.add_widget(info_row)
 
         # Кнопки
-        buttons_row = BoxLayout(size_hint_y=None, height=scale_dp(32))
-
-        # Кнопки
-        buttons_layout = BoxLayout(size_hint_x=1, spacing=scale_dp(8))
+        buttons_row = BoxLayout(size_hint_y=None, height=scale_dp(self.BUTTONS_HEIGHT))
+        self.buttons_layout = BoxLayout(size_hint_x=1, spacing=scale_dp(8))
 
         # Кнопка "Подробнее"
         view_btn = Button(
@@ -156,40 +148,87 @@ class TaskCard(BoxLayout):
             font_size=scale_font(24)
         )
         view_btn.bind(on_press=lambda x: self._on_view())
-        buttons_layout.add_widget(view_btn)
-
-        # Кнопка "Принять" или "Завершить"
-        if show_accept:
-            accept_btn = Button(
-                text='Принять задачу',
-                size_hint_x=0.3,
-                background_color=palette['success'],
-                background_normal='',
-                background_down='',
-                color=palette['text_primary'],
-                font_size=scale_font(24)
-            )
-            accept_btn.bind(on_press=lambda x: self._on_accept())
-            buttons_layout.add_widget(accept_btn)
-        elif show_complete:
-            complete_btn = Button(
-                text='Завершить',
-                size_hint_x=0.3,
-                background_color=palette['danger'],
-                background_normal='',
-                background_down='',
-                color=palette['text_primary'],
-                font_size=scale_font(24)
-            )
-            complete_btn.bind(on_press=lambda x: self._on_complete())
-            buttons_layout.add_widget(complete_btn)
+        self.buttons_layout.add_widget(view_btn)
+
+        # Кнопки "Принять" и "Завершить" создаются один раз и показываются по режиму
+        self.accept_btn = Button(
+            text='Принять задачу',
+            size_hint_x=0.3,
+            background_color=palette['success'],
+            background_normal='',
+            background_down='',
+            color=palette['text_primary'],
+            font_size=scale_font(24)
+        )
+        self.accept_btn.bind(on_press=lambda x: self._on_accept())
+
+        self.complete_btn = Button(
+            text='Завершить',
+            size_hint_x=0.3,
+            background_color=palette['danger'],
+            background_normal='',
+            background_down='',
+            color=palette['text_primary'],
+            font_size=scale_font(24)
+        )
+        self.complete_btn.bind(on_press=lambda x: self._on_complete())
 
         # Заполнитель
-        buttons_layout.add_widget(Label(size_hint_x=0.1))
+        self.filler = Label(size_hint_x=0.1)
+        self.buttons_layout.add_widget(self.filler)
+        self.action_btn = None
 
-        buttons_row.add_widget(buttons_layout)
+        buttons_row.add_widget(self.buttons_layout)
         self.add_widget(buttons_row)
 
+    def refresh_view_attrs(self, rv, index, data):
+        """Подстановка данных задачи в переиспользуемую карточку"""
+        task_data = data['task_data']
+        self.task_data = task_data
+        self.on_accept = data.get('on_accept')
+        self.on_view = data.get('on_view')
+        self.on_complete = data.get('on_complete')
+
+        status = task_data.get('status', 'new')
+        if status == 'completed':
+            self.bg_color.rgba = palette['success']
+        elif status == 'assigned':
+            self.bg_color.rgba = palette['accent_muted']
+        else:
+            self.bg_color.rgba = palette['surface_alt']
+
+        self.title_label.text = task_data.get('title', '')
+        self.dept_label.text = (task_data.get('department') or '')[:15]
+        self.desc_label.text = task_data.get('description', '')
+        self.days_label.text = f"Дней на выполнение: {task_data.get('days', 0)}"
+
+        raw_difficulty = task_data.get('difficulty', 1)
+        try:
+            difficulty_value = int(raw_difficulty)
+        except (TypeError, ValueError):
+            difficulty_value = 1
+        self.difficulty_label.text = f"Сложность: {format_difficulty(difficulty_value)}"
+
+        if data.get('show_accept'):
+            self._set_action_button(self.accept_btn)
+        elif data.get('show_complete'):
+            self._set_action_button(self.complete_btn)
+        else:
+            self._set_action_button(None)
+
+        return super().refresh_view_attrs(rv, index, data)
+
+    def _set_action_button(self, button):
+        """Показать нужную кнопку действия (перестраивается только при смене)"""
+        if self.action_btn is button:
+            return
+        if self.action_btn is not None:
+            self.buttons_layout.remove_widget(self.action_btn)
+        if button is not None:
+            # Кнопка действия стоит перед заполнителем
+            self.buttons_layout.add_widget(button, index=1)
+        self.action_btn = button
+
     def _update_bg(self, *args):
         self.bg_rect.pos = self.pos
         self.bg_rect.size = self.size
@@ -212,3 +251,27 @@ class TaskCard(BoxLayout):
     def _on_complete(self):
         if self.on_complete:
             self.on_complete(self.task_data['id'])
+
+
+class TaskList(RecycleView):
+    """Виртуализированный список задач.
+
+    Создаёт карточки только для видимых строк и переиспользует их при
+    прокрутке, поэтому память и время построения не растут с числом задач.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.do_scroll_x = False
+        self.viewclass = TaskCard
+
+        self.tasks_layout = RecycleBoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            default_size=(None, TaskCard.card_height()),
+            default_size_hint=(1, None),
+            spacing=scale_dp(5),
+            padding=[scale_dp(10), scale_dp(10), scale_dp(10), scale_dp(10)]
+        )
+        self.tasks_layout.bind(minimum_height=self.tasks_layout.setter('height'))
+        self.add_widget(self.tasks_layout)
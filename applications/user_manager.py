@@ -4,6 +4,8 @@ import os
 import sqlite3
 from typing import Dict, Optional
 
+from connection_manager import connection_manager
+
 
 class UserManager:
     """Менеджер пользователей для получения текущего user_id"""
@@ -39,58 +41,55 @@ class UserManager:
                 print(f"❌ БД {self.users_db_path} не найдена")
                 return None
 
-            conn = sqlite3.connect(self.users_db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # 3. Ищем пользователя по auth_token
-            print(f"🔍 Поиск пользователя с токеном в столбце auth_token...")
-
-            cursor.execute("SELECT * FROM users WHERE auth_token = ?", (token,))
-            user = cursor.fetchone()
-
-            if user:
-                user_data = dict(user)
-                print(f"✅ ПОЛЬЗОВАТЕЛЬ НАЙДЕН!")
-                print(f"   UID: {user_data.get('uid')}")
-                print(f"   Email: {user_data.get('email')}")
-                print(f"   Имя: {user_data.get('first_name', '')} {user_data.get('last_name', '')}")
-
-                conn.close()
-
-                return {
-                    'uid': user_data.get('uid'),
-                    'email': user_data.get('email'),
-                    'first_name': user_data.get('first_name', ''),
-                    'last_name': user_data.get('last_name', ''),
-                    'department': user_data.get('department', ''),
-                    'token': token
-                }
-            else:
-                print(f"❌ Пользователь не найден по токену")
-
-                # Выводим отладочную информацию
-                print(f"\n🔍 Отладка:")
-
-                # Проверяем все токены в БД
-                cursor.execute("SELECT uid, email, auth_token FROM users WHERE auth_token IS NOT NULL")
-                users_with_tokens = cursor.fetchall()
-
-                print(f"Пользователи с токенами в БД:")
-                for u in users_with_tokens:
-                    uid, email, user_token = u
-                    if user_token:
-                        token_preview = user_token[:30] + '...' if len(user_token) > 30 else user_token
-                        print(f"  - {uid}: {email} - токен: {token_preview}")
-
-                        # Сравниваем токены
-                        if user_token == token:
-                            print(f"    ✅ СОВПАДАЕТ с файлом!")
-                        else:
-                            print(f"    ❌ НЕ СОВПАДАЕТ")
-
-                conn.close()
-                return None
+            with connection_manager.connection(self.users_db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+
+                # 3. Ищем пользователя по auth_token
+                print(f"🔍 Поиск пользователя с токеном в столбце auth_token...")
+
+                cursor.execute("SELECT * FROM users WHERE auth_token = ?", (token,))
+                user = cursor.fetchone()
+
+                if user:
+                    user_data = dict(user)
+                    print(f"✅ ПОЛЬЗОВАТЕЛЬ НАЙДЕН!")
+                    print(f"   UID: {user_data.get('uid')}")
+                    print(f"   Email: {user_data.get('email')}")
+                    print(f"   Имя: {user_data.get('first_name', '')} {user_data.get('last_name', '')}")
+
+                    return {
+                        'uid': user_data.get('uid'),
+                        'email': user_data.get('email'),
+                        'first_name': user_data.get('first_name', ''),
+                        'last_name': user_data.get('last_name', ''),
+                        'department': user_data.get('department', ''),
+                        'token': token
+                    }
+                else:
+                    print(f"❌ Пользователь не найден по токену")
+
+                    # Выводим отладочную информацию
+                    print(f"\n🔍 Отладка:")
+
+                    # Проверяем все токены в БД
+                    cursor.execute("SELECT uid, email, auth_token FROM users WHERE auth_token IS NOT NULL")
+                    users_with_tokens = cursor.fetchall()
+
+                    print(f"Пользователи с токенами в БД:")
+                    for u in users_with_tokens:
+                        uid, email, user_token = u
+                        if user_token:
+                            token_preview = user_token[:30] + '...' if len(user_token) > 30 else user_token
+                            print(f"  - {uid}: {email} - токен: {token_preview}")
+
+                            # Сравниваем токены
+                            if user_token == token:
+                                print(f"    ✅ СОВПАДАЕТ с файлом!")
+                            else:
+                                print(f"    ❌ НЕ СОВПАДАЕТ")
+
+                    return None
 
         except Exception as e:
             print(f"❌ Ошибка при получении пользователя: {e}")
@@ -104,13 +103,10 @@ class UserManager:
             if not os.path.exists(self.users_db_path):
                 return None
 
-            conn = sqlite3.connect(self.users_db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT * FROM users WHERE uid = ?", (uid,))
-            user = cursor.fetchone()
-            conn.close()
+            with connection_manager.connection(self.users_db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.execute("SELECT * FROM users WHERE uid = ?", (uid,))
+                user = cursor.fetchone()
 
             if user:
                 return dict(user)
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+
+class ChangeNotifier:
+    """Уведомления об изменениях баз между экземплярами приложения.
+
+    После коммита писатель перезаписывает файл-метку рядом с базой
+    (<db>.changed). Подписчики в любом процессе узнают об изменении по
+    смене содержимого метки и обновляются сразу, не опрашивая саму базу.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    # Как часто проверять метки (чтение крошечного файла, к базе не обращается)
+    WATCH_INTERVAL = 0.5
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._init_notifier()
+        return cls._instance
+
+    def _init_notifier(self):
+        """Инициализирует подписки"""
+        self.subscribers_lock = threading.Lock()
+        self.subscribers = {}
+        self.versions = {}
+        self.bump_count = 0
+        self.watch_thread = None
+
+    @staticmethod
+    def sentinel_path(db_path):
+        return f'{db_path}.changed'
+
+    def bump(self, db_path):
+        """Сообщает всем экземплярам, что база изменилась (вызывать после коммита)"""
+        with self.subscribers_lock:
+            self.bump_count += 1
+            # Уникальная метка: время изменения файла бывает слишком грубым
+            token = f'{os.getpid()}:{time.time_ns()}:{self.bump_count}'
+
+        try:
+            with open(self.sentinel_path(db_path), 'w') as sentinel:
+                sentinel.write(token)
+        except OSError as e:
+            print(f"⚠️ Не удалось обновить метку изменений {db_path}: {e}")
+
+    def version(self, db_path):
+        """Текущее содержимое метки ('' — база ещё не менялась)"""
+        try:
+            with open(self.sentinel_path(db_path)) as sentinel:
+                return sentinel.read()
+        except OSError:
+            return ''
+
+    def subscribe(self, db_path, callback):
+        """Подписка на изменения базы.
+
+        callback() вызывается в потоке наблюдателя — код UI должен сам
+        перейти в главный поток (Clock.schedule_once).
+        """
+        with self.subscribers_lock:
+            callbacks = self.subscribers.setdefault(db_path, [])
+            if callback in callbacks:
+                return
+            callbacks.append(callback)
+            if db_path not in self.versions:
+                self.versions[db_path] = self.version(db_path)
+
+            if self.watch_thread is None:
+                self.watch_thread = threading.Thread(
+                    target=self._watch_loop,
+                    name='db-change-watcher',
+                    daemon=True
+                )
+                self.watch_thread.start()
+
+    def unsubscribe(self, db_path, callback):
+        """Отписка от изменений базы"""
+        with self.subscribers_lock:
+            callbacks = self.subscribers.get(db_path, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.subscribers.pop(db_path, None)
+                self.versions.pop(db_path, None)
+
+    def _watch_loop(self):
+        """Следит за метками, пока есть подписчики"""
+        while True:
+            time.sleep(self.WATCH_INTERVAL)
+
+            with self.subscribers_lock:
+                if not self.subscribers:
+                    # Поток перезапустится при следующей подписке
+                    self.watch_thread = None
+                    return
+                watched = list(self.subscribers.items())
+
+            for db_path, callbacks in watched:
+                current = self.version(db_path)
+                with self.subscribers_lock:
+                    if self.versions.get(db_path, current) == current:
+                        continue
+                    self.versions[db_path] = current
+
+                for callback in list(callbacks):
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"❌ Ошибка обработчика изменений {db_path}: {e}")
+
+
+# Синглтон экземпляр
+change_notifier = ChangeNotifier()
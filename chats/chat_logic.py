@@ -7,16 +7,29 @@ from kivy.uix.button import Button
 from kivy.clock import Clock
 from kivy.metrics import dp
 from kivy.graphics import Color, RoundedRectangle
+from datetime import datetime
 
-from .components import ChatBubble, ChatItem, NewChatPopup
+from .components import ChatItem, MessageList, NewChatPopup
 from .chat_manager import ChatManager
+from .chat_service import ChatDataService
+from change_notifier import change_notifier
+from refresh_scheduler import RefreshScheduler
 from ui_style import palette, scale_dp, scale_font
 
 
 class ChatLogic:
+    # Сколько сообщений загружать за раз (последние и при прокрутке вверх)
+    MESSAGES_PAGE_SIZE = 50
+    # Прозрачность своего сообщения, пока оно не сохранено
+    PENDING_OPACITY = 0.6
+    # Доля высоты у верхнего края, при которой подгружается история
+    LOAD_OLDER_THRESHOLD = 0.1
+
     def __init__(self, screen):
         self.screen = screen
         self.chat_manager = ChatManager()
+        # Запросы к базе чатов выполняются в фоне, UI не ждёт блокировок SQLite
+        self.data_service = ChatDataService()
         self.db_manager = None
         self.current_chat_id = None
         self.current_chat_info = None
@@ -25,9 +38,28 @@ class ChatLogic:
         self.content_container = BoxLayout(orientation='vertical')
         self.notice_bar = None
         self.notice_event = None
+
+        # Обновление списка чатов и открытого чата: частое после изменений,
+        # всё реже, пока ничего не происходит. Новые сообщения из других
+        # экземпляров приложения приходят через change_notifier
+        # (прежний опрос был раз в 5 с и 2 с — с ним сравнивается статистика)
+        self.chats_refresh = RefreshScheduler('chats', 5, 120, baseline_interval=5)
+        self.messages_refresh = RefreshScheduler('messages', 2, 60, baseline_interval=2)
+        self.chats_signature = None
+        # Первое и последнее показанные сообщения открытого чата
+        self.first_message_id = None
+        self.last_message_id = None
+        self.has_older_messages = False
+        self.is_loading_older = False
+        # Свои сообщения, уже показанные при отправке
+        self.echoed_ids = set()
+        self.echo_counter = 0
         
         self.main_layout.add_widget(self.content_container)
 
+        # Заполнение поиска и архивация — один раз за запуск, в своём потоке
+        self.chat_manager.start_background_jobs()
+
     def set_db_manager(self, db_manager):
         """Устанавливает менеджер базы данных"""
         self.db_manager = db_manager
@@ -50,34 +82,75 @@ class ChatLogic:
 
         # Планируем новые
         if not self.current_chat_id:
-            self.update_chats_event = Clock.schedule_interval(self.update_chats, 5)
+            self.chats_refresh.start(self.update_chats)
         else:
-            self.update_messages_event = Clock.schedule_interval(self.update_messages, 2)
+            self.messages_refresh.start(self.update_messages)
+        change_notifier.subscribe(self.chat_manager.chats_db.db_name, self._on_chats_db_changed)
 
     def _unschedule_updates(self):
         """Отменяет запланированные обновления"""
-        if hasattr(self, 'update_chats_event'):
-            Clock.unschedule(self.update_chats_event)
-        if hasattr(self, 'update_messages_event'):
-            Clock.unschedule(self.update_messages_event)
+        change_notifier.unsubscribe(self.chat_manager.chats_db.db_name, self._on_chats_db_changed)
+        self.chats_refresh.stop()
+        self.messages_refresh.stop()
+
+    def _on_chats_db_changed(self):
+        """База чатов изменилась (в том числе в другом экземпляре) — проверяем сразу"""
+        Clock.schedule_once(lambda dt: self._check_now())
+
+    def _check_now(self):
+        self.chats_refresh.wake()
+        self.messages_refresh.wake()
 
     def on_leave(self):
         self._unschedule_updates()
+        self.data_service.cancel('chats', 'messages', 'new_messages', 'older_messages', 'open_chat')
 
     def load_chats(self):
-        """Загружает список чатов"""
-        self.content_container.clear_widgets()
-
+        """Загружает список чатов (запрос — в фоне)"""
         if not self.chat_manager.current_user:
+            self.content_container.clear_widgets()
             self.show_not_authorized_message()
             return
 
+        self.data_service.submit('chats', self._fetch_chats, on_result=self._show_chats,
+                                 on_error=self._on_load_error)
+
+    def _fetch_chats(self):
+        """Чаты пользователя с профилями собеседников (в фоновом потоке)"""
+        chats = self.chat_manager.get_user_chats()
+
+        # Профили собеседников — одним запросом через кэш, а не по запросу на чат
+        profiles = {}
+        if chats and self.db_manager:
+            profiles = self.db_manager.get_profiles([chat['other_uid'] for chat in chats])
+
+        for chat_data in chats:
+            user_info = profiles.get(chat_data['other_uid'])
+            if user_info:
+                chat_data['first_name'] = (user_info.get('first_name') or '').strip()
+                chat_data['name'] = self._format_user_name(user_info)
+                chat_data['other_user_info'] = user_info
+            else:
+                chat_data['name'] = 'Пользователь'
+
+        return chats
+
+    def _on_load_error(self, error):
+        self.show_notice(f"Не удалось загрузить данные: {error}", kind='danger')
+
+    def _show_chats(self, chats):
+        """Строит список чатов"""
+        if self.current_chat_id:
+            return
+
+        self.content_container.clear_widgets()
+
         chats_scroll = ScrollView()
         chats_layout = GridLayout(cols=1, spacing=dp(10), size_hint_y=None, padding=[dp(12), dp(12), dp(12), dp(12)])
         chats_layout.bind(minimum_height=chats_layout.setter('height'))
         chats_scroll.add_widget(chats_layout)
 
-        chats = self.chat_manager.get_user_chats()
+        self.chats_signature = self._chats_signature(chats)
 
         if not chats:
             chats_layout.add_widget(Label(
@@ -91,17 +164,6 @@ class ChatLogic:
             chats_layout.height = dp(100)
         else:
             for chat_data in chats:
-                other_uid = chat_data['other_uid']
-                user_info = self.db_manager.get_user_by_uid(other_uid) if self.db_manager else None
-
-                if user_info:
-                    name = self._format_user_name(user_info)
-                    chat_data['first_name'] = (user_info.get('first_name') or '').strip()
-                    chat_data['name'] = name
-                    chat_data['other_user_info'] = user_info
-                else:
-                    chat_data['name'] = 'Пользователь'
-
                 # Создаем элемент чата
                 from .components import ChatItem
                 chat_item = ChatItem(chat_data)
@@ -133,7 +195,8 @@ class ChatLogic:
                 on_user_selected=self.start_chat,
                 current_uid=self.chat_manager.current_user['uid'],
                 db_manager=users_db,  # Изменено: было users_db, стало db_manager
-                chats_db=self.chat_manager.chats_db
+                chats_db=self.chat_manager.chats_db,
+                data_service=self.data_service
             )
             popup.open()
         except Exception as e:
@@ -184,16 +247,22 @@ class ChatLogic:
             self.notice_event = Clock.schedule_once(self._clear_notice, duration)
 
     def start_chat(self, user):
-        chat_id = self.chat_manager.create_chat(user['uid'])
-        if chat_id:
-            self.open_chat_by_id(chat_id, user)
+        def on_chat(chat_id):
+            if chat_id:
+                self.open_chat_by_id(chat_id, user)
+
+        self.data_service.submit('open_chat', self.chat_manager.create_chat, user['uid'],
+                                 on_result=on_chat, on_error=self._on_load_error)
 
     def open_chat(self, chat_data):
         self.open_chat_by_id(chat_data['chat_id'], chat_data.get('other_user_info'))
 
     def open_chat_by_id(self, chat_id, other_user_info=None):
+        # Ответы по предыдущему чату или списку чатов больше не нужны
+        self.data_service.cancel('chats', 'messages', 'new_messages', 'older_messages')
         self.current_chat_id = chat_id
         self.current_chat_info = other_user_info
+        self.is_loading_older = False
         self.content_container.clear_widgets()
 
         chat_top = BoxLayout(size_hint_y=None, height=dp(50))
@@ -218,15 +287,10 @@ class ChatLogic:
         chat_top.add_widget(back_btn)
         chat_top.add_widget(name_label)
 
-        self.messages_scroll = ScrollView()
-        self.messages_layout = GridLayout(
-            cols=1,
-            spacing=dp(10),
-            size_hint_y=None,
-            padding=[dp(12), dp(12), dp(12), dp(12)]
-        )
-        self.messages_layout.bind(minimum_height=self.messages_layout.setter('height'))
-        self.messages_scroll.add_widget(self.messages_layout)
+        # Список сообщений создаёт пузыри только для видимых строк
+        self.messages_scroll = MessageList()
+        self.messages_layout = self.messages_scroll.messages_layout
+        self.messages_scroll.bind(scroll_y=self._on_messages_scroll)
 
         input_panel = BoxLayout(size_hint_y=None, height=dp(50))
         self.message_input = TextInput(
@@ -249,20 +313,107 @@ class ChatLogic:
         self.content_container.add_widget(input_panel)
 
         self.load_messages()
+        self._mark_read()
         self._schedule_updates()
 
+    def _mark_read(self):
+        """Сбрасывает счётчик непрочитанных открытого чата"""
+        self.data_service.submit(None, self.chat_manager.mark_chat_read, self.current_chat_id)
+
     def load_messages(self):
+        """Полная загрузка открытого чата (запрос — в фоне)"""
         if not self.current_chat_id:
             return
 
-        self.messages_layout.clear_widgets()
-        messages = self.chat_manager.get_chat_messages(self.current_chat_id)
+        self.messages_scroll.data = []
+        self.first_message_id = None
+        self.last_message_id = None
+        self.has_older_messages = False
+        self.echoed_ids = set()
+        self.data_service.submit('messages', self.chat_manager.get_chat_messages,
+                                 self.current_chat_id, limit=self.MESSAGES_PAGE_SIZE,
+                                 on_result=self._show_messages, on_error=self._on_load_error)
+
+    def _show_messages(self, messages):
+        """Показывает последнюю страницу сообщений"""
+        # Отправленные до ответа сообщения остаются под загруженной страницей
+        pending = list(self.messages_scroll.data)
+        self.messages_scroll.data = []
+        self.last_message_id = None
+        self.first_message_id = messages[0]['id'] if messages else None
+        self.has_older_messages = len(messages) == self.MESSAGES_PAGE_SIZE
+        self._append_messages(messages)
+        self.messages_scroll.data.extend(pending)
+
+    def _on_messages_scroll(self, instance, scroll_y):
+        """Подгрузка истории у верхнего края чата"""
+        if (scroll_y >= 1 - self.LOAD_OLDER_THRESHOLD and self.has_older_messages
+                and not self.is_loading_older):
+            self.load_older_messages()
+
+    def load_older_messages(self):
+        """Загружает предыдущую страницу сообщений и добавляет её сверху"""
+        if not self.current_chat_id or self.first_message_id is None:
+            return
+
+        self.is_loading_older = True
+        self.data_service.submit('older_messages', self.chat_manager.get_chat_messages,
+                                 self.current_chat_id,
+                                 limit=self.MESSAGES_PAGE_SIZE,
+                                 before=self.first_message_id,
+                                 on_result=self._prepend_messages,
+                                 on_error=self._on_older_error)
+
+    def _on_older_error(self, error):
+        self.is_loading_older = False
+        self._on_load_error(error)
+
+    def _prepend_messages(self, messages):
+        """Добавляет страницу истории над уже показанными сообщениями"""
+        self.has_older_messages = len(messages) == self.MESSAGES_PAGE_SIZE
+        if not messages:
+            self.is_loading_older = False
+            return
+
+        # Сохраняем расстояние от низа, чтобы чат не прыгнул
+        scroll = self.messages_scroll
+        layout = self.messages_layout
+        scrolled_from_bottom = scroll.scroll_y * max(layout.height - scroll.height, 0)
+
+        rows = [self._message_row(message) for message in messages]
+        scroll.data = rows + list(scroll.data)
+        self.first_message_id = messages[0]['id']
+
+        def restore_position(dt):
+            scrollable = layout.height - scroll.height
+            if scrollable > 0:
+                scroll.scroll_y = min(1, max(0, scrolled_from_bottom / scrollable))
+            self.is_loading_older = False
+
+        Clock.schedule_once(restore_position)
+
+    def _append_messages(self, messages):
+        """Добавляет сообщения в конец чата, не трогая уже показанные"""
+        # Уже показанные (в том числе свои, выведенные сразу при отправке) пропускаем
+        new_messages = [
+            message for message in messages
+            if (self.last_message_id is None or message['id'] > self.last_message_id)
+            and message['id'] not in self.echoed_ids
+        ]
+        if messages:
+            self.last_message_id = max(self.last_message_id or 0, messages[-1]['id'])
+            self.echoed_ids.difference_update(message['id'] for message in messages)
+        if not new_messages:
+            return
+
+        self.messages_scroll.data.extend(self._message_row(message) for message in new_messages)
+        self._scroll_to_bottom()
 
-        for message in messages:
-            is_own = message['sender_uid'] == self.chat_manager.current_user['uid']
-            bubble = ChatBubble(message, is_own)
-            self.messages_layout.add_widget(bubble)
+    def _message_row(self, message):
+        is_own = message['sender_uid'] == self.chat_manager.current_user['uid']
+        return self.messages_scroll.message_row(message, is_own)
 
+    def _scroll_to_bottom(self):
         if hasattr(self, 'messages_scroll'):
             Clock.schedule_once(lambda dt: setattr(self.messages_scroll, 'scroll_y', 0))
 
@@ -270,23 +421,108 @@ class ChatLogic:
         if not self.current_chat_id or not self.message_input.text.strip():
             return
 
-        self.chat_manager.send_message(self.current_chat_id, self.message_input.text.strip())
+        text = self.message_input.text.strip()
         self.message_input.text = ''
-        self.load_messages()
+
+        # Сообщение показывается сразу, бледным — пока не сохранено
+        echo = {
+            'id': None,
+            'sender_uid': self.chat_manager.current_user['uid'],
+            'text': text,
+            'timestamp': datetime.now().isoformat()
+        }
+        message_list = self.messages_scroll
+        self.echo_counter += 1
+        local_id = self.echo_counter
+        row = message_list.message_row(echo, True, opacity=self.PENDING_OPACITY)
+        row['local_id'] = local_id
+        message_list.data.append(row)
+        self._scroll_to_bottom()
+
+        chat_id = self.current_chat_id
+        self.data_service.submit(
+            None, self.chat_manager.send_message, chat_id, text,
+            on_result=lambda message_id: self._on_message_sent(chat_id, message_list, local_id, message_id),
+            on_error=lambda error: self._on_message_failed(message_list, local_id, error)
+        )
+        # Собеседник, скорее всего, скоро ответит
+        self.messages_refresh.activity()
+
+    @staticmethod
+    def _find_echo(message_list, local_id):
+        for index, row in enumerate(message_list.data):
+            if row.get('local_id') == local_id:
+                return index
+        return None
+
+    def _on_message_sent(self, chat_id, message_list, local_id, message_id):
+        """Сообщение сохранено — подтверждаем эхо и дочитываем новые"""
+        if not message_id:
+            self._on_message_failed(message_list, local_id, None)
+            return
+
+        index = self._find_echo(message_list, local_id)
+        if index is not None:
+            message_list.data[index] = {**message_list.data[index], 'message_id': message_id, 'opacity': 1}
+
+        if chat_id == self.current_chat_id:
+            # При следующей выборке это сообщение уже показано
+            self.echoed_ids.add(message_id)
+            self.update_messages()
+
+    def _on_message_failed(self, message_list, local_id, error):
+        index = self._find_echo(message_list, local_id)
+        if index is not None:
+            del message_list.data[index]
+        self.show_notice('Не удалось отправить сообщение', kind='danger')
 
     def show_chat_list(self):
+        self.data_service.cancel('messages', 'new_messages', 'older_messages')
         self.current_chat_id = None
         self.current_chat_info = None
         self._schedule_updates()
         self.load_chats()
 
-    def update_chats(self, dt):
+    def update_chats(self):
+        """Проверяет список чатов в фоне; перерисовывает, только если он изменился"""
+        if self.current_chat_id or not self.chat_manager.current_user:
+            return False
+
+        def on_chats(chats):
+            changed = self._chats_signature(chats) != self.chats_signature
+            if changed:
+                self._show_chats(chats)
+            self.chats_refresh.report(changed)
+
+        self.data_service.submit('chats', self._fetch_chats, on_result=on_chats,
+                                 on_error=lambda error: self.chats_refresh.report(False))
+        return None
+
+    def update_messages(self):
+        """Запрашивает в фоне только новые сообщения открытого чата"""
         if not self.current_chat_id:
-            self.load_chats()
+            return False
+
+        def on_messages(messages):
+            self._append_messages(messages)
+            own_uid = self.chat_manager.current_user['uid']
+            # Пришедшее в открытый чат сразу прочитано
+            if any(message['sender_uid'] != own_uid for message in messages):
+                self._mark_read()
+            self.messages_refresh.report(bool(messages))
+
+        self.data_service.submit('new_messages', self.chat_manager.get_messages_after,
+                                 self.current_chat_id, self.last_message_id,
+                                 on_result=on_messages,
+                                 on_error=lambda error: self.messages_refresh.report(False))
+        return None
 
-    def update_messages(self, dt):
-        if self.current_chat_id:
-            self.load_messages()
+    @staticmethod
+    def _chats_signature(chats):
+        return [
+            (chat['chat_id'], chat['last_message_time'], chat['last_message'], chat.get('unread_count', 0))
+            for chat in chats
+        ]
 
     def show_not_authorized_message(self):
         """Показывает сообщение о необходимости авторизации"""
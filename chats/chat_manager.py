@@ -21,15 +21,43 @@ class ChatManager:
             return None
         return self.chats_db.create_or_get_chat(self.current_user['uid'], other_uid)
 
-    def get_chat_messages(self, chat_id):
-        return self.chats_db.get_chat_messages(chat_id)
+    def get_chat_messages(self, chat_id, limit=50, before=None):
+        return self.chats_db.get_chat_messages(chat_id, limit=limit, before=before)
 
-    def send_message(self, chat_id, text):
+    def get_unread_counts(self):
+        if not self.current_user:
+            return {}
+        return self.chats_db.get_unread_counts(self.current_user['uid'])
+
+    def mark_chat_read(self, chat_id):
         if not self.current_user:
             return False
+        return self.chats_db.mark_chat_read(chat_id, self.current_user['uid'])
+
+    def get_messages_after(self, chat_id, last_message_id):
+        return self.chats_db.get_messages_after(chat_id, last_message_id)
+
+    def send_message(self, chat_id, text):
+        """Отправляет сообщение, возвращает его id (None без пользователя)"""
+        if not self.current_user:
+            return None
+
+        return self.chats_db.add_message(chat_id, self.current_user['uid'], text)
+
+    def search_messages(self, user_uid, query, limit=20):
+        """Поиск по сообщениям чатов пользователя (с фрагментами текста).
+        Архивные сообщения не ищутся"""
+        if not user_uid:
+            return []
+        return self.chats_db.search_messages(user_uid, query, limit)
+
+    def is_search_ready(self):
+        """Проиндексированы ли для поиска все старые сообщения"""
+        return self.chats_db.search_index_ready()
 
-        self.chats_db.add_message(chat_id, self.current_user['uid'], text)
-        return True
+    def start_background_jobs(self):
+        """Заполнение поиска и архивация старых сообщений в отдельном потоке"""
+        self.chats_db.start_background_jobs()
 
     def search_users(self, search_term, users_db):
         if not self.current_user:
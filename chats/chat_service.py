@@ -0,0 +1,78 @@
+import queue
+import threading
+
+from kivy.clock import Clock
+
+
+class ChatDataService:
+    """Выполняет запросы чатов в фоновом потоке и отдаёт результат в UI-поток.
+
+    Каждый запрос относится к каналу ('chats', 'messages' и т.п.). Новый
+    запрос в канале делает предыдущие устаревшими: ещё не начатые не
+    выполняются, а результаты уже выполненных не доставляются. Запросы без
+    канала (отправка сообщения) выполняются и доставляются всегда.
+    Запросы выполняются строго по очереди, в порядке поступления.
+    """
+
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.generations = {}
+
+        self.worker_thread = threading.Thread(
+            target=self._process_queue,
+            name='chat-data',
+            daemon=True
+        )
+        self.worker_thread.start()
+
+    def submit(self, channel, func, *args, on_result=None, on_error=None, **kwargs):
+        """Ставит запрос в очередь; колбэки вызываются в UI-потоке"""
+        generation = None
+        if channel is not None:
+            with self.lock:
+                generation = self.generations.get(channel, 0) + 1
+                self.generations[channel] = generation
+
+        self.requests.put((channel, generation, func, args, kwargs, on_result, on_error))
+
+    def cancel(self, *channels):
+        """Отменяет ожидающие и выполняющиеся запросы каналов"""
+        with self.lock:
+            for channel in channels:
+                self.generations[channel] = self.generations.get(channel, 0) + 1
+
+    def _is_current(self, channel, generation):
+        if channel is None:
+            return True
+        with self.lock:
+            return self.generations.get(channel) == generation
+
+    def _process_queue(self):
+        """Обрабатывает очередь запросов"""
+        while True:
+            channel, generation, func, args, kwargs, on_result, on_error = self.requests.get()
+
+            # Устаревший запрос даже не выполняем
+            if not self._is_current(channel, generation):
+                continue
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                print(f"❌ Ошибка запроса чатов ({channel}): {e}")
+                if on_error:
+                    Clock.schedule_once(
+                        lambda dt, e=e, callback=on_error: self._deliver(channel, generation, callback, e)
+                    )
+                continue
+
+            if on_result:
+                Clock.schedule_once(
+                    lambda dt, result=result, callback=on_result: self._deliver(channel, generation, callback, result)
+                )
+
+    def _deliver(self, channel, generation, callback, value):
+        """Передаёт результат, если пользователь не ушёл к другим данным"""
+        if self._is_current(channel, generation):
+            callback(value)
@@ -3,119 +3,220 @@ from kivy.uix.label import Label
 from kivy.uix.button import ButtonBehavior
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.popup import Popup
 from kivy.uix.relativelayout import RelativeLayout
 from kivy.core.window import Window
+from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle, RoundedRectangle
-from kivy.metrics import dp
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.core.text import Label as CoreLabel
+from kivy.metrics import dp, sp
 from datetime import datetime
+from functools import lru_cache
 import colorsys
 from ui_style import palette, scale_dp, scale_font
 from .utils import truncate, LAST_MESSAGE_PREVIEW_LIMIT
 
 
-class ChatBubble(BoxLayout):
-    def __init__(self, message, is_own=False, **kwargs):
+@lru_cache(maxsize=4096)
+def measure_message(text, time_text, max_width):
+    """Размер пузыря сообщения при максимальной ширине max_width.
+
+    Возвращает (ширина, высота, высота строки времени).
+
+    Текст измеряется один раз для каждой пары «текст — ширина», поэтому
+    прокрутка и повторные обновления не пересчитывают раскладку.
+    """
+    padding = ChatBubble.BUBBLE_PADDING
+    inner_width = max(max_width - padding[0] - padding[2], dp(20))
+
+    text_width, text_height = _measure_text(text, ChatBubble.TEXT_FONT_SIZE, inner_width)
+    time_width, time_height = _measure_text(time_text, ChatBubble.TIME_FONT_SIZE, inner_width)
+
+    width = min(max_width, max(text_width, time_width) + padding[0] + padding[2])
+    height = text_height + time_height + padding[1] + padding[3] + ChatBubble.BUBBLE_SPACING
+    return width, height, time_height
+
+
+def _measure_text(text, font_size, max_width):
+    """Размер текста; если он не помещается в строку — с переносом по max_width"""
+    label = CoreLabel(text=text, font_size=font_size)
+    label.refresh()
+    width, height = label.texture.size if label.texture else (0, 0)
+    if width <= max_width:
+        return width, height
+
+    label = CoreLabel(text=text, font_size=font_size, text_size=(max_width, None))
+    label.refresh()
+    return max_width, label.texture.size[1]
+
+
+def format_message_time(timestamp):
+    try:
+        dt = datetime.fromisoformat(timestamp)
+        return dt.strftime('%H:%M')
+    except:
+        return timestamp
+
+
+class ChatBubble(RecycleDataViewBehavior, BoxLayout):
+    """Пузырь сообщения.
+
+    Создаётся списком MessageList один раз и переиспользуется для разных
+    сообщений: размер пузыря берётся из данных строки, текст заново не
+    измеряется.
+    """
+
+    TEXT_FONT_SIZE = sp(15)
+    TIME_FONT_SIZE = dp(10)
+    BUBBLE_PADDING = [dp(12), dp(8), dp(12), dp(8)]
+    BUBBLE_SPACING = dp(4)
+    ROW_PADDING = [dp(12), dp(6), dp(12), dp(6)]
+
+    OWN_COLOR = (0.2, 0.6, 1, 1)
+    OTHER_COLOR = (0.92, 0.92, 0.92, 1)
+
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'horizontal'
         self.size_hint = (1, None)
-        self.padding = [dp(12), dp(6), dp(12), dp(6)]
+        self.padding = self.ROW_PADDING
         self.spacing = dp(8)
 
-        self.is_own = is_own
-        self.bubble_padding = [dp(12), dp(8), dp(12), dp(8)]
-        self.max_bubble_width = Window.width * 0.7
-
         self.message_layout = BoxLayout(
             orientation='vertical',
             size_hint=(None, None),
-            padding=self.bubble_padding,
-            spacing=dp(4)
+            padding=self.BUBBLE_PADDING,
+            spacing=self.BUBBLE_SPACING
         )
 
         self.message_label = Label(
-            text=message.get('text', ''),
             size_hint_y=None,
+            font_size=self.TEXT_FONT_SIZE,
             halign='left',
-            valign='top',
-            color=(1, 1, 1, 1) if is_own else (0.1, 0.1, 0.1, 1)
+            valign='top'
         )
-        self.message_label.bind(texture_size=self._update_message_size)
-
-        time_text = self._format_time(message.get('timestamp', ''))
         self.time_label = Label(
-            text=time_text,
             size_hint_y=None,
-            font_size=dp(10),
-            color=(0.85, 0.85, 0.85, 1) if is_own else (0.5, 0.5, 0.5, 1),
-            halign='right' if is_own else 'left',
+            font_size=self.TIME_FONT_SIZE,
             valign='bottom'
         )
-        self.time_label.bind(texture_size=self._update_time_size)
-
         self.message_layout.add_widget(self.message_label)
         self.message_layout.add_widget(self.time_label)
 
-        if is_own:
-            self.add_widget(BoxLayout(size_hint_x=1))
-            self.add_widget(self.message_layout)
-        else:
-            self.add_widget(self.message_layout)
-            self.add_widget(BoxLayout(size_hint_x=1))
+        # Заполнители по бокам прижимают пузырь вправо (свои) или влево
+        self.left_filler = BoxLayout()
+        self.right_filler = BoxLayout()
+        self.add_widget(self.left_filler)
+        self.add_widget(self.message_layout)
+        self.add_widget(self.right_filler)
 
         with self.message_layout.canvas.before:
-            self._bubble_color = Color(0.2, 0.6, 1, 1) if is_own else Color(0.92, 0.92, 0.92, 1)
+            self._bubble_color = Color(*self.OTHER_COLOR)
             self._bubble_rect = RoundedRectangle(pos=self.message_layout.pos, size=self.message_layout.size,
                                                  radius=[dp(12)] * 4)
 
         self.message_layout.bind(pos=self._update_bubble_rect, size=self._update_bubble_rect)
-        Window.bind(on_resize=self._on_window_resize)
-        self._update_text_sizes()
 
-    def _format_time(self, timestamp):
-        try:
-            dt = datetime.fromisoformat(timestamp)
-            return dt.strftime('%H:%M')
-        except:
-            return timestamp
+    def refresh_view_attrs(self, rv, index, data):
+        """Подстановка сообщения в переиспользуемый пузырь"""
+        is_own = data['is_own']
+        width, height = data['bubble_size']
+        inner_width = width - self.BUBBLE_PADDING[0] - self.BUBBLE_PADDING[2]
+        time_height = data['time_height']
 
-    def _on_window_resize(self, *args):
-        self.max_bubble_width = Window.width * 0.7
-        self._update_text_sizes()
+        self.left_filler.size_hint_x = 1 if is_own else 0
+        self.right_filler.size_hint_x = 0 if is_own else 1
+        self.message_layout.size = (width, height)
+        self._bubble_color.rgba = self.OWN_COLOR if is_own else self.OTHER_COLOR
 
-    def _update_text_sizes(self):
-        inner_width = self.max_bubble_width - (self.bubble_padding[0] + self.bubble_padding[2])
+        text_height = height - time_height - self.BUBBLE_PADDING[1] - self.BUBBLE_PADDING[3] - self.BUBBLE_SPACING
+        self.message_label.text = data['text']
         self.message_label.text_size = (inner_width, None)
+        self.message_label.height = text_height
+        self.message_label.color = (1, 1, 1, 1) if is_own else (0.1, 0.1, 0.1, 1)
+
+        self.time_label.text = data['time_text']
         self.time_label.text_size = (inner_width, None)
+        self.time_label.height = time_height
+        self.time_label.halign = 'right' if is_own else 'left'
+        self.time_label.color = (0.85, 0.85, 0.85, 1) if is_own else (0.5, 0.5, 0.5, 1)
 
-    def _update_message_size(self, instance, size):
-        instance.height = size[1]
-        self._update_bubble_size()
-
-    def _update_time_size(self, instance, size):
-        instance.height = size[1]
-        self._update_bubble_size()
-
-    def _update_bubble_size(self):
-        max_text_width = max(self.message_label.texture_size[0], self.time_label.texture_size[0])
-        width = min(self.max_bubble_width, max_text_width + self.bubble_padding[0] + self.bubble_padding[2])
-        self.message_layout.width = width
-        self.message_layout.height = (
-            self.message_label.texture_size[1]
-            + self.time_label.texture_size[1]
-            + self.bubble_padding[1]
-            + self.bubble_padding[3]
-            + dp(4)
-        )
-        self.height = self.message_layout.height + self.padding[1] + self.padding[3]
+        # Своё сообщение бледное, пока не сохранено
+        self.opacity = data.get('opacity', 1)
+
+        return super().refresh_view_attrs(rv, index, data)
 
     def _update_bubble_rect(self, *args):
         self._bubble_rect.pos = self.message_layout.pos
         self._bubble_rect.size = self.message_layout.size
 
 
+class MessageList(RecycleView):
+    """Виртуализированный список сообщений чата.
+
+    Пузыри создаются только для видимых строк и переиспользуются при
+    прокрутке. Высота каждой строки вычисляется один раз и хранится в
+    данных, поэтому длинная история не замедляет прокрутку.
+    """
+
+    # Доля ширины окна, которую может занимать пузырь
+    BUBBLE_WIDTH_RATIO = 0.7
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.do_scroll_x = False
+        self.viewclass = ChatBubble
+
+        self.messages_layout = RecycleBoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            default_size_hint=(1, None),
+            spacing=dp(10),
+            padding=[dp(12), dp(12), dp(12), dp(12)]
+        )
+        self.messages_layout.bind(minimum_height=self.messages_layout.setter('height'))
+        self.add_widget(self.messages_layout)
+
+        self.max_bubble_width = self._max_bubble_width()
+        Window.bind(on_resize=self._on_window_resize)
+
+    def _max_bubble_width(self):
+        return int(Window.width * self.BUBBLE_WIDTH_RATIO)
+
+    def message_row(self, message, is_own, opacity=1):
+        """Строка данных списка для сообщения"""
+        time_text = format_message_time(message.get('timestamp', ''))
+        row = {
+            'message_id': message.get('id'),
+            'is_own': is_own,
+            'text': message.get('text', ''),
+            'time_text': time_text,
+            'opacity': opacity
+        }
+        self._measure_row(row)
+        return row
+
+    def _measure_row(self, row):
+        width, height, time_height = measure_message(row['text'], row['time_text'], self.max_bubble_width)
+        row['bubble_size'] = (width, height)
+        row['time_height'] = time_height
+        row['height'] = height + ChatBubble.ROW_PADDING[1] + ChatBubble.ROW_PADDING[3]
+
+    def _on_window_resize(self, *args):
+        # Размеры пересчитываются только при смене ширины, результаты кэшируются
+        max_width = self._max_bubble_width()
+        if max_width == self.max_bubble_width:
+            return
+        self.max_bubble_width = max_width
+        rows = list(self.data)
+        for row in rows:
+            self._measure_row(row)
+        self.data = rows
+
+
 class ChatItem(ButtonBehavior, BoxLayout):
     def __init__(self, chat_data, **kwargs):
         super().__init__(**kwargs)
@@ -192,9 +293,21 @@ class ChatItem(ButtonBehavior, BoxLayout):
         )
         time_label.bind(size=lambda instance, value: setattr(instance, 'text_size', (value[0], None)))
 
+        # Справа — время и число непрочитанных
+        side_layout = BoxLayout(orientation='vertical', size_hint_x=None, width=dp(64), spacing=dp(4))
+        side_layout.add_widget(time_label)
+
+        unread_count = chat_data.get('unread_count', 0)
+        if unread_count:
+            badge_row = BoxLayout(size_hint_y=None, height=dp(22))
+            badge_row.add_widget(BoxLayout())
+            badge_row.add_widget(self._build_unread_badge(unread_count))
+            side_layout.add_widget(badge_row)
+        side_layout.add_widget(BoxLayout())
+
         main_info = BoxLayout(orientation='horizontal')
         main_info.add_widget(info_layout)
-        main_info.add_widget(time_label)
+        main_info.add_widget(side_layout)
 
         info_layout.add_widget(name_label)
         info_layout.add_widget(last_msg_label)
@@ -209,6 +322,22 @@ class ChatItem(ButtonBehavior, BoxLayout):
         self.bind(pos=self._update_rect, size=self._update_rect)
         self.bind(state=self._update_state)
 
+    @staticmethod
+    def _build_unread_badge(unread_count):
+        badge = Label(
+            text=str(unread_count) if unread_count < 100 else '99+',
+            size_hint=(None, None),
+            size=(dp(30), dp(22)),
+            color=palette['text_primary'],
+            font_size=dp(12),
+            bold=True
+        )
+        with badge.canvas.before:
+            Color(*palette['accent'])
+            badge_rect = RoundedRectangle(pos=badge.pos, size=badge.size, radius=[dp(11)] * 4)
+        badge.bind(pos=lambda instance, value: setattr(badge_rect, 'pos', value))
+        return badge
+
     def _get_avatar_letter(self):
         first_name = (self.chat_data.get('first_name') or '').strip()
         if first_name:
@@ -259,8 +388,115 @@ class ChatItem(ButtonBehavior, BoxLayout):
             return ''
 
 
+class UserRow(RecycleDataViewBehavior, BoxLayout):
+    """Строка найденного пользователя.
+
+    Создаётся списком UserList один раз и переиспользуется: при новом
+    поиске меняются только тексты, фон и виджеты не пересоздаются.
+    """
+
+    ROW_HEIGHT = 64
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.user = None
+        self.on_select = None
+
+        self.orientation = 'horizontal'
+        self.size_hint_y = None
+        self.height = scale_dp(self.ROW_HEIGHT)
+        self.padding = scale_dp(10)
+        self.spacing = scale_dp(8)
+
+        with self.canvas.before:
+            Color(*palette['surface_alt'])
+            self._item_bg = RoundedRectangle(pos=self.pos, size=self.size,
+                                             radius=[scale_dp(10)] * 4)
+        self.bind(pos=self._update_bg, size=self._update_bg)
+
+        info_layout = BoxLayout(orientation='vertical')
+        self.name_label = Label(
+            halign='left',
+            color=palette['text_primary'],
+            font_size=scale_font(15)
+        )
+        self.name_label.bind(size=self.name_label.setter('text_size'))
+
+        self.uid_label = Label(
+            halign='left',
+            color=palette['text_muted'],
+            font_size=scale_font(12)
+        )
+        self.uid_label.bind(size=self.uid_label.setter('text_size'))
+
+        info_layout.add_widget(self.name_label)
+        info_layout.add_widget(self.uid_label)
+
+        select_btn = Button(
+            text='Написать',
+            size_hint_x=0.3,
+            background_color=palette['accent_muted'],
+            background_normal='',
+            background_down='',
+            color=palette['text_primary'],
+            font_size=scale_font(13),
+            on_press=lambda x: self._on_select()
+        )
+
+        self.add_widget(info_layout)
+        self.add_widget(select_btn)
+
+    def refresh_view_attrs(self, rv, index, data):
+        """Подстановка пользователя в переиспользуемую строку"""
+        self.user = data['user']
+        self.on_select = data.get('on_select')
+        self.name_label.text = self.user['name']
+        self.uid_label.text = f"UID: {self.user['uid']}"
+        return super().refresh_view_attrs(rv, index, data)
+
+    def _update_bg(self, *args):
+        self._item_bg.pos = self.pos
+        self._item_bg.size = self.size
+
+    def _on_select(self):
+        if self.on_select:
+            self.on_select(self.user)
+
+
+class UserList(RecycleView):
+    """Виртуализированный список результатов поиска пользователей"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.do_scroll_x = False
+        self.viewclass = UserRow
+
+        self.users_layout = RecycleBoxLayout(
+            orientation='vertical',
+            size_hint_y=None,
+            default_size=(None, scale_dp(UserRow.ROW_HEIGHT)),
+            default_size_hint=(1, None),
+            spacing=dp(5)
+        )
+        self.users_layout.bind(minimum_height=self.users_layout.setter('height'))
+        self.add_widget(self.users_layout)
+
+
 class NewChatPopup(Popup):
-    def __init__(self, on_user_selected, current_uid, db_manager, chats_db, **kwargs):  # Заменили users_db на db_manager
+    """Выбор собеседника для нового чата.
+
+    Поиск идёт по мере ввода: запрос уходит через SEARCH_DELAY после
+    последнего нажатия и выполняется в фоне (data_service). Ответы на
+    устаревшие запросы отбрасываются.
+    """
+
+    # Пауза после ввода, после которой запускается поиск (с)
+    SEARCH_DELAY = 0.3
+    # Поиск при вводе начинается с такой длины запроса (кнопка ищет всегда)
+    MIN_SEARCH_LENGTH = 2
+    SEARCH_CHANNEL = 'user_search'
+
+    def __init__(self, on_user_selected, current_uid, db_manager, chats_db, data_service, **kwargs):  # Заменили users_db на db_manager
         super().__init__(**kwargs)
         self.title = 'Новый чат'
         self.size_hint = (0.9, 0.8)
@@ -270,6 +506,9 @@ class NewChatPopup(Popup):
         self.current_uid = current_uid
         self.db_manager = db_manager  # Сохраняем db_manager
         self.chats_db = chats_db
+        self.data_service = data_service
+        self.last_search_term = None
+        self.search_trigger = Clock.create_trigger(self._on_search_delay, self.SEARCH_DELAY)
 
         layout = BoxLayout(orientation='vertical', padding=scale_dp(12), spacing=scale_dp(10))
         with layout.canvas.before:
@@ -284,7 +523,7 @@ class NewChatPopup(Popup):
         search_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=scale_dp(48),
                                   spacing=scale_dp(8))
         self.search_input = TextInput(
-            hint_text='Поиск по UID или email...',
+            hint_text='Поиск по имени, UID или email...',
             multiline=False,
             size_hint_x=0.8,
             background_color=palette['surface_alt'],
@@ -294,6 +533,7 @@ class NewChatPopup(Popup):
             background_active='',
             font_size=scale_font(25)
         )
+        self.search_input.bind(text=self._on_search_text, on_text_validate=self.search_users)
         search_btn = Button(
             text='Найти',
             background_color=palette['accent'],
@@ -307,94 +547,83 @@ class NewChatPopup(Popup):
         search_layout.add_widget(search_btn)
         layout.add_widget(search_layout)
 
-        self.results_scroll = ScrollView()
-        self.results_layout = GridLayout(cols=1, spacing=dp(5), size_hint_y=None)
-        self.results_layout.bind(minimum_height=self.results_layout.setter('height'))
-        self.results_scroll.add_widget(self.results_layout)
-        layout.add_widget(self.results_scroll)
+        # Статус поиска («не найдены», ошибка); скрыт, пока есть результаты
+        self.status_label = Label(
+            size_hint_y=None,
+            height=0,
+            color=palette['text_muted'],
+            font_size=scale_font(15)
+        )
+        layout.add_widget(self.status_label)
+
+        self.results_list = UserList()
+        layout.add_widget(self.results_list)
 
         self.content = layout
+        self.bind(on_dismiss=lambda *args: self._cancel_search())
+
+    def _on_search_text(self, instance, text):
+        """Каждое нажатие откладывает поиск; запрос уйдёт после паузы в вводе"""
+        self.search_trigger.cancel()
+        if len(text.strip()) < self.MIN_SEARCH_LENGTH:
+            self._cancel_search()
+            self._show_users([])
+            return
+        self.search_trigger()
+
+    def _on_search_delay(self, dt):
+        self._start_search(self.search_input.text.strip())
 
     def search_users(self, instance):
-        self.results_layout.clear_widgets()
+        """Поиск сразу, без паузы (кнопка «Найти» и Enter)"""
+        self.search_trigger.cancel()
         search_term = self.search_input.text.strip()
-
         if not search_term:
+            self._cancel_search()
+            self._show_users([])
             return
+        self._start_search(search_term)
 
-        try:
-            # Используем поиск из базы данных пользователей
-            users = self.db_manager.search_users(search_term, self.current_uid)
-
-            if not users:
-                self.results_layout.add_widget(Label(
-                    text='Пользователи не найдены',
-                    size_hint_y=None,
-                    height=dp(40),
-                    color=(0.8, 0.8, 0.8, 1)
-                ))
-                return
-
-            for user in users:
-                user_item = BoxLayout(
-                    orientation='horizontal',
-                    size_hint_y=None,
-                    height=scale_dp(64),
-                    padding=scale_dp(10),
-                    spacing=scale_dp(8)
-                )
-                with user_item.canvas.before:
-                    Color(*palette['surface_alt'])
-                    item_bg = RoundedRectangle(pos=user_item.pos, size=user_item.size,
-                                               radius=[scale_dp(10)] * 4)
-                user_item.bind(
-                    pos=lambda *args: setattr(item_bg, 'pos', user_item.pos),
-                    size=lambda *args: setattr(item_bg, 'size', user_item.size)
-                )
-
-                info_layout = BoxLayout(orientation='vertical')
-                name_label = Label(
-                    text=user['name'],
-                    halign='left',
-                    color=palette['text_primary'],
-                    font_size=scale_font(15)
-                )
-                name_label.bind(size=name_label.setter('text_size'))
-
-                uid_label = Label(
-                    text=f"UID: {user['uid']}",
-                    halign='left',
-                    color=palette['text_muted'],
-                    font_size=scale_font(12)
-                )
-                uid_label.bind(size=uid_label.setter('text_size'))
-
-                info_layout.add_widget(name_label)
-                info_layout.add_widget(uid_label)
-
-                select_btn = Button(
-                    text='Написать',
-                    size_hint_x=0.3,
-                    background_color=palette['accent_muted'],
-                    background_normal='',
-                    background_down='',
-                    color=palette['text_primary'],
-                    font_size=scale_font(13),
-                    on_press=lambda x, u=user: self.select_user(u)
-                )
-
-                user_item.add_widget(info_layout)
-                user_item.add_widget(select_btn)
-                self.results_layout.add_widget(user_item)
-
-        except Exception as e:
-            print(f"Error searching users: {e}")
-            self.results_layout.add_widget(Label(
-                text=f'Ошибка поиска: {str(e)}',
-                size_hint_y=None,
-                height=dp(40),
-                color=(1, 0, 0, 1)
-            ))
+    def _start_search(self, search_term):
+        """Запрос в фоне; предыдущий запрос становится устаревшим"""
+        if search_term == self.last_search_term:
+            return
+        self.last_search_term = search_term
+        self.data_service.submit(
+            self.SEARCH_CHANNEL,
+            self.db_manager.search_users, search_term, self.current_uid,
+            on_result=self._show_users,
+            on_error=self._show_search_error
+        )
+
+    def _cancel_search(self):
+        self.search_trigger.cancel()
+        self.last_search_term = None
+        self.data_service.cancel(self.SEARCH_CHANNEL)
+
+    def _show_users(self, users):
+        """Показ результатов: строки списка переиспользуются"""
+        if users or self.last_search_term is None:
+            self._set_status('')
+        else:
+            self._set_status('Пользователи не найдены')
+
+        self.results_list.data = [
+            {'user': user, 'on_select': self.select_user}
+            for user in users
+        ]
+        self.results_list.scroll_y = 1
+
+    def _show_search_error(self, error):
+        print(f"Error searching users: {error}")
+        self.last_search_term = None
+        self.results_list.data = []
+        self._set_status(f'Ошибка поиска: {error}', color=palette['danger'])
+
+    def _set_status(self, text, color=None):
+        self.status_label.text = text
+        self.status_label.color = color or palette['text_muted']
+        self.status_label.height = dp(40) if text else 0
 
     def select_user(self, user):
         self.dismiss()
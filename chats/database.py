@@ -1,19 +1,45 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import json
 import threading
+import time
+import uuid
+import zlib
+
+from change_notifier import change_notifier
+from connection_manager import connection_manager
 
 
 class ChatsDatabase:
+    # Сообщения старше стольких дней переносятся в архив (и выпадают из поиска)
+    ARCHIVE_AFTER_DAYS = 180
+    # Фоновые задачи (заполнение поиска, архивация) идут короткими
+    # транзакциями по столько сообщений, с паузой между ними, чтобы
+    # не задерживать запись новых сообщений
+    SEARCH_BACKFILL_BATCH_SIZE = 2000
+    ARCHIVE_BATCH_SIZE = 2000
+    BACKGROUND_PAUSE = 0.05
+    # Сколько распакованных архивных сегментов держать в памяти
+    ARCHIVE_CACHE_SIZE = 8
+    # Выгрузка читает базу порциями, загрузка пишет пачками в одной транзакции
+    EXPORT_CHUNK_SIZE = 1000
+    IMPORT_BATCH_SIZE = 5000
+    EXPORT_FORMAT = 1
+
     def __init__(self, db_name='data_chats.db'):
         self.local = threading.local()
         self.db_name = db_name
+        self.archive_cache = OrderedDict()
+        self.archive_cache_lock = threading.Lock()
+        self.maintenance_thread = None
         self._get_connection()
         self.create_tables()
 
     def _get_connection(self):
         """Получает соединение для текущего потока"""
         if not hasattr(self.local, 'conn'):
-            self.local.conn = sqlite3.connect(self.db_name, timeout=30.0, check_same_thread=False)
+            self.local.conn = connection_manager.connect(self.db_name)
             self.local.cursor = self.local.conn.cursor()
         return self.local.conn, self.local.cursor
 
@@ -45,6 +71,278 @@ class ChatsDatabase:
         ''')
 
         conn.commit()
+        self._migrate(conn)
+
+    # ---------- Миграции ----------
+
+    def _migrate(self, conn):
+        """Применяет миграции, номер последней хранится в PRAGMA user_version"""
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        for number, migration in enumerate(self.MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            migration(self, conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+            print(f"Миграция чатов {number} ({migration.__name__}) применена")
+
+    def _migration_message_indexes(self, conn):
+        """Индексы для выборки сообщений чата и чатов пользователя"""
+        # Сообщения чата по порядку — без полного просмотра таблицы
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_chat
+            ON messages(chat_id, message_id)
+        ''')
+        # Поиск по uid1 покрывает уникальный индекс (uid1, uid2), для uid2 нужен свой
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chats_uid2
+            ON chats(uid2)
+        ''')
+        conn.commit()
+
+    def _migration_last_message(self, conn):
+        """Последнее сообщение хранится прямо в чате, список чатов читается одним запросом"""
+        existing_columns = {
+            column[1] for column in conn.execute('PRAGMA table_info(chats)').fetchall()
+        }
+        for column_name, column_type in (('last_message_id', 'INTEGER'),
+                                         ('last_message_text', 'TEXT'),
+                                         ('last_message_sender', 'TEXT')):
+            if column_name not in existing_columns:
+                conn.execute(f'ALTER TABLE chats ADD COLUMN {column_name} {column_type}')
+
+        # Заполняем по уже существующим сообщениям
+        conn.execute('''
+            UPDATE chats SET
+                last_message_id = (
+                    SELECT MAX(message_id) FROM messages WHERE chat_id = chats.chat_id
+                )
+        ''')
+        conn.execute('''
+            UPDATE chats SET
+                last_message_text = (
+                    SELECT message_text FROM messages WHERE message_id = chats.last_message_id
+                ),
+                last_message_sender = (
+                    SELECT sender_uid FROM messages WHERE message_id = chats.last_message_id
+                ),
+                last_message_time = (
+                    SELECT timestamp FROM messages WHERE message_id = chats.last_message_id
+                )
+            WHERE last_message_id IS NOT NULL
+        ''')
+        conn.commit()
+
+    def _migration_message_search(self, conn):
+        """Полнотекстовый индекс сообщений (FTS5), синхронизируемый триггерами"""
+        try:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    message_text,
+                    content='messages',
+                    content_rowid='message_id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            # SQLite собран без FTS5 — поиск по сообщениям будет недоступен
+            print(f"⚠️ Полнотекстовый поиск недоступен: {e}")
+            return
+
+        conn.executescript('''
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert
+            AFTER INSERT ON messages
+            BEGIN
+                INSERT INTO messages_fts (rowid, message_text)
+                VALUES (NEW.message_id, NEW.message_text);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete
+            AFTER DELETE ON messages
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, message_text)
+                VALUES ('delete', OLD.message_id, OLD.message_text);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update
+            AFTER UPDATE OF message_text ON messages
+            BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, message_text)
+                VALUES ('delete', OLD.message_id, OLD.message_text);
+                INSERT INTO messages_fts (rowid, message_text)
+                VALUES (NEW.message_id, NEW.message_text);
+            END;
+        ''')
+
+        # Новые сообщения индексируют триггеры, уже существующие —
+        # фоновая задача backfill_search_index (на больших базах это
+        # долго, поэтому не при запуске в UI-потоке)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS message_search_backfill (
+                next_id INTEGER NOT NULL,
+                upto_id INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO message_search_backfill (next_id, upto_id)
+            SELECT 0, (SELECT MAX(message_id) FROM messages)
+            WHERE EXISTS (SELECT 1 FROM messages)
+        ''')
+        conn.commit()
+
+    def _migration_chat_members(self, conn):
+        """Участники чатов со счётчиком непрочитанных, обновляемым при записи"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_members (
+                chat_id INTEGER NOT NULL,
+                uid TEXT NOT NULL,
+                last_read_message_id INTEGER NOT NULL DEFAULT 0,
+                unread_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chat_id, uid)
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_chat_members_uid
+            ON chat_members(uid)
+        ''')
+
+        # Существующие чаты считаем прочитанными
+        for column in ('uid1', 'uid2'):
+            conn.execute(f'''
+                INSERT OR IGNORE INTO chat_members (chat_id, uid, last_read_message_id)
+                SELECT chat_id, {column}, COALESCE(last_message_id, 0) FROM chats
+            ''')
+        conn.commit()
+
+    def _migration_message_archive(self, conn):
+        """Архив старых сообщений: сжатый сегмент на чат и месяц"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS message_archive (
+                chat_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                first_message_id INTEGER NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                message_count INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (chat_id, month)
+            )
+        ''')
+        # Для чтения истории назад от заданного сообщения
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_message_archive_chat_last
+            ON message_archive(chat_id, last_message_id)
+        ''')
+        conn.commit()
+
+    def _migration_message_timestamp_index(self, conn):
+        """Индекс по времени: архивация находит старые сообщения без обхода таблицы"""
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_messages_timestamp
+            ON messages(timestamp)
+        ''')
+        conn.commit()
+
+    def _migration_import_progress(self, conn):
+        """Идентификатор базы и точки докачки загрузок из других баз"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS database_info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        conn.execute(
+            "INSERT OR IGNORE INTO database_info (key, value) VALUES ('database_id', ?)",
+            (uuid.uuid4().hex,)
+        )
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS import_progress (
+                source_id TEXT PRIMARY KEY,
+                last_message_id INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.commit()
+
+    MIGRATIONS = [
+        _migration_message_indexes,
+        _migration_last_message,
+        _migration_message_search,
+        _migration_chat_members,
+        _migration_message_archive,
+        _migration_message_timestamp_index,
+        _migration_import_progress,
+    ]
+
+    def rebuild_search_index(self, conn=None):
+        """Перестраивает поисковый индекс целиком (ручное восстановление; долго)"""
+        if conn is None:
+            conn, cursor = self._get_connection()
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        conn.commit()
+        print("🔎 Поисковый индекс сообщений перестроен")
+
+    def search_index_ready(self):
+        """Готов ли поиск: False, пока старые сообщения ещё индексируются
+        (до этого search_messages находит только часть сообщений)"""
+        conn, cursor = self._get_connection()
+        cursor.execute('''
+            SELECT name FROM sqlite_master
+            WHERE name IN ('messages_fts', 'message_search_backfill')
+        ''')
+        tables = {row[0] for row in cursor.fetchall()}
+        if 'messages_fts' not in tables:
+            # SQLite без FTS5 — поиск недоступен
+            return False
+        if 'message_search_backfill' not in tables:
+            # Индекс построен целиком ещё при создании (старые версии)
+            return True
+        cursor.execute('SELECT 1 FROM message_search_backfill LIMIT 1')
+        return cursor.fetchone() is None
+
+    def backfill_search_index(self):
+        """Добавляет в поисковый индекс сообщения, существовавшие до его создания.
+
+        Идёт пачками по SEARCH_BACKFILL_BATCH_SIZE; место остановки
+        хранится в message_search_backfill, так что прерванное заполнение
+        продолжается при следующем запуске.
+        """
+        conn, cursor = self._get_connection()
+        indexed = 0
+        while True:
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('SELECT next_id, upto_id FROM message_search_backfill')
+                state = cursor.fetchone()
+            except sqlite3.OperationalError:
+                state = None
+            if state is None:
+                conn.rollback()
+                break
+
+            next_id, upto_id = state
+            cursor.execute('''
+                SELECT message_id, message_text FROM messages
+                WHERE message_id > ? AND message_id <= ?
+                ORDER BY message_id
+                LIMIT ?
+            ''', (next_id, upto_id, self.SEARCH_BACKFILL_BATCH_SIZE))
+            rows = cursor.fetchall()
+
+            if rows:
+                cursor.executemany('INSERT INTO messages_fts (rowid, message_text) VALUES (?, ?)', rows)
+                cursor.execute('UPDATE message_search_backfill SET next_id = ?', (rows[-1][0],))
+                indexed += len(rows)
+            else:
+                cursor.execute('DELETE FROM message_search_backfill')
+                print(f"🔎 Поисковый индекс сообщений готов (добавлено {indexed})")
+            conn.commit()
+
+            if not rows:
+                break
+            time.sleep(self.BACKGROUND_PAUSE)
+        return indexed
+
+    # ---------- Чаты и сообщения ----------
 
     def create_or_get_chat(self, uid1, uid2):
         """Создает или получает чат"""
@@ -60,8 +358,11 @@ class ChatsDatabase:
         else:
             cursor.execute('INSERT INTO chats (uid1, uid2, last_message_time) VALUES (?, ?, ?)',
                            (user1, user2, datetime.now().isoformat()))
+            chat_id = cursor.lastrowid
+            cursor.executemany('INSERT OR IGNORE INTO chat_members (chat_id, uid) VALUES (?, ?)',
+                               [(chat_id, user1), (chat_id, user2)])
             conn.commit()
-            return cursor.lastrowid
+            return chat_id
 
     def add_message(self, chat_id, sender_uid, message_text):
         """Добавляет сообщение"""
@@ -74,10 +375,33 @@ class ChatsDatabase:
             VALUES (?, ?, ?, ?)
         ''', (chat_id, sender_uid, message_text, timestamp))
 
-        cursor.execute('UPDATE chats SET last_message_time = ? WHERE chat_id = ?',
-                       (timestamp, chat_id))
+        message_id = cursor.lastrowid
+
+        # Последнее сообщение дублируется в чат для списка чатов
+        cursor.execute('''
+            UPDATE chats SET
+                last_message_time = ?,
+                last_message_id = ?,
+                last_message_text = ?,
+                last_message_sender = ?
+            WHERE chat_id = ?
+        ''', (timestamp, message_id, message_text, sender_uid, chat_id))
+
+        # Счётчики непрочитанных — в той же транзакции: у получателя +1,
+        # отправитель прочитал чат до своего сообщения
+        cursor.execute('''
+            UPDATE chat_members SET unread_count = unread_count + 1
+            WHERE chat_id = ? AND uid != ?
+        ''', (chat_id, sender_uid))
+        cursor.execute('''
+            UPDATE chat_members SET unread_count = 0, last_read_message_id = ?
+            WHERE chat_id = ? AND uid = ?
+        ''', (message_id, chat_id, sender_uid))
         conn.commit()
-        return cursor.lastrowid
+
+        # Собеседник в другом экземпляре приложения обновит чат сразу
+        change_notifier.bump(self.db_name)
+        return message_id
 
     def get_user_chats(self, user_uid):
         """Получает чаты пользователя"""
@@ -85,20 +409,17 @@ class ChatsDatabase:
 
         cursor.execute('''
             SELECT c.chat_id, c.uid1, c.uid2, c.last_message_time,
-                   m.message_text, m.timestamp, m.sender_uid
+                   c.last_message_text, c.last_message_sender,
+                   COALESCE(cm.unread_count, 0)
             FROM chats c
-            LEFT JOIN messages m ON m.message_id = (
-                SELECT message_id FROM messages 
-                WHERE chat_id = c.chat_id 
-                ORDER BY timestamp DESC LIMIT 1
-            )
+            LEFT JOIN chat_members cm ON cm.chat_id = c.chat_id AND cm.uid = ?
             WHERE c.uid1 = ? OR c.uid2 = ?
             ORDER BY c.last_message_time DESC
-        ''', (user_uid, user_uid))
+        ''', (user_uid, user_uid, user_uid))
 
         chats = []
         for chat in cursor.fetchall():
-            chat_id, uid1, uid2, last_time, last_msg, msg_time, sender_uid = chat
+            chat_id, uid1, uid2, last_time, last_msg, sender_uid, unread_count = chat
             other_uid = uid2 if uid1 == user_uid else uid1
 
             chats.append({
@@ -106,35 +427,609 @@ class ChatsDatabase:
                 'other_uid': other_uid,
                 'last_message': last_msg or '',
                 'last_message_time': last_time,
-                'last_message_sender': sender_uid
+                'last_message_sender': sender_uid,
+                'unread_count': unread_count
             })
 
         return chats
 
-    def get_chat_messages(self, chat_id, limit=50):
-        """Получает сообщения чата"""
+    def get_unread_counts(self, user_uid):
+        """Непрочитанные по чатам пользователя: {chat_id: количество}"""
         conn, cursor = self._get_connection()
 
         cursor.execute('''
-            SELECT message_id, sender_uid, message_text, timestamp
+            SELECT chat_id, unread_count FROM chat_members
+            WHERE uid = ? AND unread_count > 0
+        ''', (user_uid,))
+        return dict(cursor.fetchall())
+
+    def mark_chat_read(self, chat_id, user_uid):
+        """Отмечает чат прочитанным до последнего сообщения"""
+        conn, cursor = self._get_connection()
+
+        cursor.execute('''
+            UPDATE chat_members SET
+                unread_count = 0,
+                last_read_message_id = COALESCE(
+                    (SELECT last_message_id FROM chats WHERE chat_id = ?), last_read_message_id
+                )
+            WHERE chat_id = ? AND uid = ? AND unread_count > 0
+        ''', (chat_id, chat_id, user_uid))
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def get_chat_messages(self, chat_id, limit=50, before=None):
+        """Получает последние limit сообщений чата (или limit сообщений до before).
+
+        Сообщения возвращаются по возрастанию. Запрос читает индекс
+        (chat_id, message_id) с конца и останавливается через limit строк,
+        поэтому не зависит от длины чата.
+        """
+        conn, cursor = self._get_connection()
+
+        if before is None:
+            cursor.execute('''
+                SELECT message_id, sender_uid, message_text, timestamp
+                FROM messages
+                WHERE chat_id = ?
+                ORDER BY message_id DESC
+                LIMIT ?
+            ''', (chat_id, limit))
+        else:
+            cursor.execute('''
+                SELECT message_id, sender_uid, message_text, timestamp
+                FROM messages
+                WHERE chat_id = ? AND message_id < ?
+                ORDER BY message_id DESC
+                LIMIT ?
+            ''', (chat_id, before, limit))
+
+        messages = [self._message_from_row(msg) for msg in cursor.fetchall()]
+        messages.reverse()
+
+        # Не хватило горячих сообщений — дочитываем из архива
+        if len(messages) < limit:
+            boundary = messages[0]['id'] if messages else before
+            archived = self._get_archived_messages(chat_id, limit - len(messages), boundary)
+            messages = archived + messages
+
+        return messages
+
+    # ---------- Архив ----------
+
+    def start_background_jobs(self):
+        """Запускает обслуживание базы в отдельном потоке со своим соединением.
+
+        Сначала дозаполняется поисковый индекс, затем старые сообщения
+        переносятся в архив (архивация удаляет строки из индекса, поэтому
+        ждёт его заполнения). Поток не занимает очередь запросов чатов:
+        список чатов, сообщения и поиск не ждут окончания работы.
+        """
+        if self.maintenance_thread is not None and self.maintenance_thread.is_alive():
+            return
+        self.maintenance_thread = threading.Thread(
+            target=self._run_background_jobs,
+            name='chat-maintenance',
+            daemon=True
+        )
+        self.maintenance_thread.start()
+
+    def _run_background_jobs(self):
+        try:
+            self.backfill_search_index()
+            self.archive_old_messages()
+        except Exception as e:
+            print(f"Ошибка обслуживания базы чатов: {e}")
+        finally:
+            # Соединение фонового потока больше не понадобится
+            self.close()
+
+    def archive_old_messages(self, older_than_days=None):
+        """Переносит старые сообщения в сжатые помесячные сегменты.
+
+        Старые сообщения выбираются по индексу idx_messages_timestamp
+        пачками по ARCHIVE_BATCH_SIZE; каждая пачка переносится своей
+        короткой транзакцией и добавляется к уже имеющимся сегментам.
+        Возвращает число перенесённых сообщений.
+
+        Архивные сообщения не попадают в поиск search_messages.
+        """
+        if older_than_days is None:
+            older_than_days = self.ARCHIVE_AFTER_DAYS
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+
+        conn, cursor = self._get_connection()
+        archived = 0
+        while True:
+            try:
+                moved = self._archive_batch(conn, cutoff)
+            except Exception as e:
+                conn.rollback()
+                print(f"Ошибка архивации сообщений: {e}")
+                break
+            if not moved:
+                break
+            archived += moved
+            # Между пачками база свободна для записи новых сообщений
+            time.sleep(self.BACKGROUND_PAUSE)
+
+        if archived:
+            print(f"🗄 В архив перенесено сообщений: {archived}")
+        return archived
+
+    def _archive_batch(self, conn, cutoff):
+        """Переносит в архив одну пачку самых старых сообщений"""
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT message_id, chat_id, sender_uid, message_text, timestamp
             FROM messages
-            WHERE chat_id = ?
-            ORDER BY timestamp ASC
+            WHERE timestamp < ?
+            ORDER BY timestamp
             LIMIT ?
-        ''', (chat_id, limit))
+        ''', (cutoff, self.ARCHIVE_BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            conn.rollback()
+            return 0
+
+        # Пачка раскладывается по сегментам «чат — месяц»
+        segments = {}
+        for message_id, chat_id, sender_uid, text, timestamp in rows:
+            segments.setdefault((chat_id, timestamp[:7]), []).append(
+                [message_id, sender_uid, text, timestamp]
+            )
+
+        for (chat_id, month), messages in segments.items():
+            cursor.execute('SELECT data FROM message_archive WHERE chat_id = ? AND month = ?',
+                           (chat_id, month))
+            existing = cursor.fetchone()
+            if existing:
+                messages = self._decode_segment(existing[0]) + messages
+            messages.sort(key=lambda row: row[0])
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO message_archive
+                (chat_id, month, first_message_id, last_message_id, message_count, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (chat_id, month, messages[0][0], messages[-1][0], len(messages),
+                  self._encode_segment(messages)))
+
+        cursor.executemany('DELETE FROM messages WHERE message_id = ?',
+                           [(row[0],) for row in rows])
+        conn.commit()
+        return len(rows)
+
+    @staticmethod
+    def _encode_segment(rows):
+        return zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'), 6)
+
+    @staticmethod
+    def _decode_segment(data):
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    def _get_archived_messages(self, chat_id, limit, before=None):
+        """Последние limit архивных сообщений чата до before (по возрастанию)"""
+        conn, cursor = self._get_connection()
+        if before is None:
+            cursor.execute('''
+                SELECT month, message_count FROM message_archive
+                WHERE chat_id = ?
+                ORDER BY last_message_id DESC
+            ''', (chat_id,))
+        else:
+            cursor.execute('''
+                SELECT month, message_count FROM message_archive
+                WHERE chat_id = ? AND first_message_id < ?
+                ORDER BY last_message_id DESC
+            ''', (chat_id, before))
 
         messages = []
-        for msg in cursor.fetchall():
-            msg_id, sender_uid, text, timestamp = msg
-            messages.append({
+        # Сегменты читаются с конца, пока не наберётся нужное число сообщений
+        for month, message_count in cursor.fetchall():
+            rows = self._load_segment(chat_id, month, message_count)
+            if before is not None:
+                rows = [row for row in rows if row[0] < before]
+            messages = [self._message_from_row(row) for row in rows[-(limit - len(messages)):]] + messages
+            if len(messages) >= limit:
+                break
+
+        return messages
+
+    def _load_segment(self, chat_id, month, message_count):
+        """Распакованный сегмент; недавние держатся в памяти для постраничного чтения"""
+        key = (chat_id, month, message_count)
+        with self.archive_cache_lock:
+            if key in self.archive_cache:
+                self.archive_cache.move_to_end(key)
+                return self.archive_cache[key]
+
+        conn, cursor = self._get_connection()
+        cursor.execute('SELECT data FROM message_archive WHERE chat_id = ? AND month = ?',
+                       (chat_id, month))
+        row = cursor.fetchone()
+        rows = self._decode_segment(row[0]) if row else []
+
+        with self.archive_cache_lock:
+            self.archive_cache[key] = rows
+            while len(self.archive_cache) > self.ARCHIVE_CACHE_SIZE:
+                self.archive_cache.popitem(last=False)
+        return rows
+
+    # ---------- Выгрузка и загрузка ----------
+
+    def export_jsonl(self, after_message_id=0, chunk_size=None):
+        """Выгрузка базы чатов построчно в JSONL (генератор строк).
+
+        Порядок: заголовок, чаты, участники, архивные сегменты, сообщения
+        по возрастанию message_id. Всё читается порциями по ключу, так что
+        память не зависит от размера базы. after_message_id — выгрузить
+        только сообщения новее (докачка на машину, где часть уже есть:
+        import_position(database_id()) на приёмнике).
+        """
+        chunk_size = chunk_size or self.EXPORT_CHUNK_SIZE
+        conn, cursor = self._get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        yield self._jsonl_line({'type': 'header', 'format': self.EXPORT_FORMAT,
+                                'user_version': version, 'database_id': self.database_id()})
+
+        chat_columns = ('chat_id', 'uid1', 'uid2', 'last_message_time',
+                        'last_message_id', 'last_message_text', 'last_message_sender')
+        for row in self._iter_chunks(f'''
+                SELECT {', '.join(chat_columns)} FROM chats
+                WHERE chat_id > ? ORDER BY chat_id LIMIT ?
+                ''', chunk_size):
+            yield self._jsonl_line({'type': 'chat', **dict(zip(chat_columns, row))})
+
+        for row in self._iter_chunks('''
+                SELECT rowid, chat_id, uid, last_read_message_id, unread_count
+                FROM chat_members
+                WHERE rowid > ? ORDER BY rowid LIMIT ?
+                ''', chunk_size):
+            yield self._jsonl_line({'type': 'member', 'chat_id': row[1], 'uid': row[2],
+                                    'last_read_message_id': row[3], 'unread_count': row[4]})
+
+        # Сегменты архива выгружаются целиком — их размер ограничен месяцем одного чата
+        for row in self._iter_chunks('''
+                SELECT rowid, chat_id, month, data FROM message_archive
+                WHERE rowid > ? ORDER BY rowid LIMIT ?
+                ''', chunk_size):
+            rows = [message for message in self._decode_segment(row[3])
+                    if message[0] > after_message_id]
+            if rows:
+                yield self._jsonl_line({'type': 'archive', 'chat_id': row[1],
+                                        'month': row[2], 'messages': rows})
+
+        for row in self._iter_chunks('''
+                SELECT message_id, chat_id, sender_uid, message_text, timestamp
+                FROM messages
+                WHERE message_id > ? ORDER BY message_id LIMIT ?
+                ''', chunk_size, start=after_message_id):
+            yield self._jsonl_line({'type': 'message', 'message_id': row[0], 'chat_id': row[1],
+                                    'sender_uid': row[2], 'message_text': row[3],
+                                    'timestamp': row[4]})
+
+    def _iter_chunks(self, query, chunk_size, start=0):
+        """Строки запроса порциями по первому столбцу (ключу).
+
+        Каждая порция — отдельный короткий запрос, поэтому выгрузка не
+        держит транзакцию чтения и не мешает писателям.
+        """
+        conn, cursor = self._get_connection()
+        last_key = start
+        while True:
+            rows = conn.execute(query, (last_key, chunk_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_key = rows[-1][0]
+
+    @staticmethod
+    def _jsonl_line(record):
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+    def import_jsonl(self, lines, batch_size=None):
+        """Загрузка выгрузки export_jsonl из любого итератора строк (например, файла).
+
+        Пишет пачками через executemany, каждая пачка — одна транзакция.
+        Первая загрузка из источника (database_id в заголовке) возможна
+        только в пустую базу. Номер последнего загруженного сообщения
+        хранится в import_progress в той же транзакции, что и пачка, так
+        что прерванную загрузку можно запустить заново с того же файла,
+        а позже догрузить выгрузку export_jsonl(after_message_id=
+        import_position(...)). Чат, чей chat_id в базе занят другими
+        участниками, останавливает загрузку с ValueError.
+        Возвращает число загруженных сообщений.
+        """
+        batch_size = batch_size or self.IMPORT_BATCH_SIZE
+        conn, cursor = self._get_connection()
+
+        source_id = None
+        resume_after = 0
+
+        # Записи идут группами по типу; пачка сбрасывается при смене типа,
+        # чтобы чаты попадали в базу раньше своих сообщений
+        batch_kind = None
+        batch = []
+        imported = 0
+        skipped = 0
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            kind = record.get('type')
+
+            if kind == 'header':
+                if record.get('format') != self.EXPORT_FORMAT:
+                    raise ValueError(f"Неподдерживаемый формат выгрузки: {record.get('format')}")
+                source_id = record.get('database_id')
+                if not source_id:
+                    raise ValueError("В заголовке выгрузки нет database_id")
+                resume_after = self._begin_import(conn, source_id)
+                continue
+            if source_id is None:
+                raise ValueError("Выгрузка должна начинаться с заголовка")
+
+            if kind != batch_kind or len(batch) >= batch_size:
+                if batch:
+                    imported += self._write_import_batch(conn, source_id, batch_kind, batch)
+                batch_kind = kind
+                batch = []
+
+            if kind == 'chat':
+                batch.append((
+                    record['chat_id'], record['uid1'], record['uid2'],
+                    record.get('last_message_time'), record.get('last_message_id'),
+                    record.get('last_message_text'), record.get('last_message_sender')
+                ))
+            elif kind == 'member':
+                batch.append((
+                    record['chat_id'], record['uid'],
+                    record.get('last_read_message_id', 0), record.get('unread_count', 0)
+                ))
+            elif kind == 'archive':
+                batch.append((record['chat_id'], record['month'], record['messages']))
+            elif kind == 'message':
+                if record['message_id'] <= resume_after:
+                    skipped += 1
+                    continue
+                batch.append((
+                    record['message_id'], record['chat_id'], record['sender_uid'],
+                    record['message_text'], record['timestamp']
+                ))
+            else:
+                raise ValueError(f"Неизвестная запись выгрузки: {kind}")
+
+        if batch:
+            imported += self._write_import_batch(conn, source_id, batch_kind, batch)
+
+        if skipped:
+            print(f"⏭ Уже загружено ранее, пропущено сообщений: {skipped}")
+        print(f"📥 Загружено сообщений: {imported}")
+        change_notifier.bump(self.db_name)
+        return imported
+
+    def _begin_import(self, conn, source_id):
+        """Начало или продолжение загрузки из источника; возвращает точку докачки"""
+        with conn:
+            row = conn.execute('SELECT last_message_id FROM import_progress WHERE source_id = ?',
+                               (source_id,)).fetchone()
+            if row:
+                print(f"↪ Продолжение загрузки после сообщения {row[0]}")
+                return row[0]
+
+            # Новый источник: id чатов и сообщений переносятся как есть,
+            # поэтому в базе не должно быть своих данных
+            for table in ('chats', 'messages', 'message_archive', 'chat_members'):
+                if conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+                    raise ValueError(f"Загрузка возможна только в пустую базу: в {table} уже есть данные")
+
+            conn.execute('INSERT INTO import_progress (source_id, last_message_id) VALUES (?, 0)',
+                         (source_id,))
+            return 0
+
+    def import_position(self, source_id):
+        """Последнее загруженное из источника сообщение (0 — загрузки не было)"""
+        conn, cursor = self._get_connection()
+        cursor.execute('SELECT last_message_id FROM import_progress WHERE source_id = ?',
+                       (source_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _write_import_batch(self, conn, source_id, kind, batch):
+        """Записывает пачку одной транзакцией; возвращает число новых сообщений"""
+        try:
+            with conn:
+                if kind == 'chat':
+                    self._import_chats(conn, batch)
+                    return 0
+
+                if kind == 'member':
+                    # Состояние прочтения, уже имеющееся в базе, не перезаписываем.
+                    # Счётчик непрочитанных новых участников считается заново
+                    # по загружаемым сообщениям (_update_imported_unread)
+                    conn.executemany('''
+                        INSERT OR IGNORE INTO chat_members
+                        (chat_id, uid, last_read_message_id, unread_count)
+                        VALUES (?, ?, ?, 0)
+                    ''', [member[:3] for member in batch])
+                    return 0
+
+                if kind == 'archive':
+                    return self._import_archive(conn, batch)
+
+                conn.executemany('''
+                    INSERT INTO messages
+                    (message_id, chat_id, sender_uid, message_text, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', batch)
+                self._update_imported_unread(conn, batch)
+                conn.execute('UPDATE import_progress SET last_message_id = ? WHERE source_id = ?',
+                             (batch[-1][0], source_id))
+                return len(batch)
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Выгрузка конфликтует с данными базы ({kind}): {e}") from e
+
+    def _update_imported_unread(self, conn, batch):
+        """Счётчики непрочитанных по загруженным сообщениям — как в add_message.
+
+        Своё сообщение отмечает чат прочитанным до него, чужое после
+        отметки прочтения добавляет участнику непрочитанное.
+        """
+        chats = {}
+        for message_id, chat_id, sender_uid, text, timestamp in batch:
+            chats.setdefault(chat_id, []).append((message_id, sender_uid))
+
+        for chat_id, messages in chats.items():
+            members = conn.execute('''
+                SELECT uid, last_read_message_id, unread_count
+                FROM chat_members WHERE chat_id = ?
+            ''', (chat_id,)).fetchall()
+
+            for uid, last_read, unread in members:
+                own = [message_id for message_id, sender in messages if sender == uid]
+                if own and own[-1] > last_read:
+                    last_read = own[-1]
+                    unread = 0
+                unread += sum(1 for message_id, sender in messages
+                              if sender != uid and message_id > last_read)
+                conn.execute('''
+                    UPDATE chat_members SET last_read_message_id = ?, unread_count = ?
+                    WHERE chat_id = ? AND uid = ?
+                ''', (last_read, unread, chat_id, uid))
+
+    def _import_chats(self, conn, batch):
+        """Новые чаты вставляются, уже загруженные проверяются и догоняются"""
+        for chat in batch:
+            chat_id, uid1, uid2, last_time, last_id, last_text, last_sender = chat
+            existing = conn.execute('SELECT uid1, uid2 FROM chats WHERE chat_id = ?',
+                                    (chat_id,)).fetchone()
+            if existing is None:
+                conn.execute('''
+                    INSERT INTO chats
+                    (chat_id, uid1, uid2, last_message_time,
+                     last_message_id, last_message_text, last_message_sender)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', chat)
+            elif tuple(existing) != (uid1, uid2):
+                raise ValueError(f"Чат {chat_id} в базе принадлежит другим участникам")
+            else:
+                # Докачка: последнее сообщение могло обновиться
+                conn.execute('''
+                    UPDATE chats SET
+                        last_message_time = ?,
+                        last_message_id = ?,
+                        last_message_text = ?,
+                        last_message_sender = ?
+                    WHERE chat_id = ? AND COALESCE(last_message_id, 0) < ?
+                ''', (last_time, last_id, last_text, last_sender, chat_id, last_id or 0))
+
+    def _import_archive(self, conn, batch):
+        added = 0
+        for chat_id, month, rows in batch:
+            existing = conn.execute(
+                'SELECT data FROM message_archive WHERE chat_id = ? AND month = ?',
+                (chat_id, month)
+            ).fetchone()
+            # Повторная загрузка: добавляем только недостающие сообщения
+            current = self._decode_segment(existing[0]) if existing else []
+            known = {row[0] for row in current}
+            new_rows = [row for row in rows if row[0] not in known]
+            if not new_rows:
+                continue
+            rows = sorted(current + new_rows, key=lambda row: row[0])
+            conn.execute('''
+                INSERT OR REPLACE INTO message_archive
+                (chat_id, month, first_message_id, last_message_id, message_count, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (chat_id, month, rows[0][0], rows[-1][0], len(rows),
+                  self._encode_segment(rows)))
+            added += len(new_rows)
+        with self.archive_cache_lock:
+            self.archive_cache.clear()
+        return added
+
+    def database_id(self):
+        """Постоянный идентификатор базы — по нему приёмник узнаёт источник выгрузки"""
+        conn, cursor = self._get_connection()
+        cursor.execute("SELECT value FROM database_info WHERE key = 'database_id'")
+        return cursor.fetchone()[0]
+
+    def get_messages_after(self, chat_id, last_message_id, limit=100):
+        """Получает сообщения чата, пришедшие после last_message_id"""
+        conn, cursor = self._get_connection()
+
+        # Один поиск по индексу (chat_id, message_id); без новых сообщений — пустой ответ
+        cursor.execute('''
+            SELECT message_id, sender_uid, message_text, timestamp
+            FROM messages
+            WHERE chat_id = ? AND message_id > ?
+            ORDER BY message_id ASC
+            LIMIT ?
+        ''', (chat_id, last_message_id or 0, limit))
+
+        return [self._message_from_row(msg) for msg in cursor.fetchall()]
+
+    def search_messages(self, user_uid, query, limit=20):
+        """Ищет сообщения в чатах пользователя.
+
+        Возвращает найденные сообщения по убыванию релевантности с
+        фрагментом текста, где совпадения выделены «». Ищутся только
+        сообщения за последние ARCHIVE_AFTER_DAYS дней: перенесённые в
+        архив (archive_old_messages) в поиск не попадают. Пока
+        search_index_ready() возвращает False, старые сообщения ещё
+        индексируются и результаты неполные.
+        """
+        match = self._fts_query(query)
+        if not match:
+            return []
+
+        conn, cursor = self._get_connection()
+        try:
+            cursor.execute('''
+                SELECT m.message_id, m.chat_id, m.sender_uid, m.timestamp,
+                       snippet(messages_fts, 0, '«', '»', '…', 12)
+                FROM messages_fts
+                JOIN messages m ON m.message_id = messages_fts.rowid
+                JOIN chats c ON c.chat_id = m.chat_id
+                WHERE messages_fts MATCH ? AND (c.uid1 = ? OR c.uid2 = ?)
+                ORDER BY bm25(messages_fts)
+                LIMIT ?
+            ''', (match, user_uid, user_uid, limit))
+        except sqlite3.OperationalError as e:
+            print(f"Ошибка поиска сообщений: {e}")
+            return []
+
+        results = []
+        for msg_id, chat_id, sender_uid, timestamp, snippet in cursor.fetchall():
+            results.append({
                 'id': msg_id,
+                'chat_id': chat_id,
                 'sender_uid': sender_uid,
-                'text': text,
                 'timestamp': timestamp,
-                'time_display': self._format_time(timestamp)
+                'time_display': self._format_time(timestamp),
+                'snippet': snippet
             })
+        return results
 
-        return messages
+    @staticmethod
+    def _fts_query(query):
+        """Запрос пользователя -> выражение FTS5: каждое слово как префикс"""
+        terms = [term.replace('"', '""') for term in (query or '').split()]
+        return ' '.join(f'"{term}"*' for term in terms if term)
+
+    def _message_from_row(self, row):
+        msg_id, sender_uid, text, timestamp = row
+        return {
+            'id': msg_id,
+            'sender_uid': sender_uid,
+            'text': text,
+            'timestamp': timestamp,
+            'time_display': self._format_time(timestamp)
+        }
 
     def _format_time(self, timestamp):
         try:
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionManager:
+    """Общий пул соединений SQLite для всех баз приложения.
+
+    Для каждого файла БД хранит пул свободных соединений и применяет к
+    каждому новому соединению одинаковые PRAGMA.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    TIMEOUT = 30.0
+    # Сколько свободных соединений держать на один файл
+    MAX_IDLE = 4
+    PRAGMAS = {
+        'synchronous': 'NORMAL',
+        'cache_size': -8000,        # ~8 МБ кэша страниц
+        'mmap_size': 64 * 1024 * 1024,
+        'busy_timeout': int(TIMEOUT * 1000),
+    }
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._init_manager()
+        return cls._instance
+
+    def _init_manager(self):
+        """Инициализирует пулы"""
+        self.pools_lock = threading.Lock()
+        self.idle = {}
+        self.stats = {}
+        self.wal_ready = set()
+
+    def _get_stats(self, db_path):
+        if db_path not in self.stats:
+            self.stats[db_path] = {
+                'opened': 0,
+                'closed': 0,
+                'checkouts': 0,
+                'reused': 0,
+                'in_use': 0
+            }
+        return self.stats[db_path]
+
+    def connect(self, db_path, read_only=False):
+        """Открывает новое настроенное соединение.
+
+        Для владельцев долгоживущих соединений (например, по одному на поток).
+        Такое соединение закрывает сам владелец.
+        """
+        if read_only:
+            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True,
+                                   timeout=self.TIMEOUT, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(db_path, timeout=self.TIMEOUT, check_same_thread=False)
+            self._ensure_wal(db_path, conn)
+
+        for name, value in self.PRAGMAS.items():
+            conn.execute(f'PRAGMA {name}={value}')
+
+        with self.pools_lock:
+            self._get_stats(db_path)['opened'] += 1
+        return conn
+
+    def _ensure_wal(self, db_path, conn):
+        """Переводит файл в режим WAL (настройка хранится в самом файле)"""
+        if db_path in self.wal_ready:
+            return
+        conn.execute('PRAGMA journal_mode=WAL')
+        self.wal_ready.add(db_path)
+
+    @contextmanager
+    def connection(self, db_path):
+        """Берёт соединение из пула на время блока with.
+
+        При выходе без ошибки незавершённая транзакция фиксируется, при
+        ошибке — откатывается. Затем соединение возвращается в пул.
+        """
+        conn = self._acquire(db_path)
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(db_path, conn)
+
+    def _acquire(self, db_path):
+        with self.pools_lock:
+            stats = self._get_stats(db_path)
+            stats['checkouts'] += 1
+            stats['in_use'] += 1
+            idle = self.idle.get(db_path)
+            if idle:
+                stats['reused'] += 1
+                return idle.pop()
+
+        try:
+            return self.connect(db_path)
+        except Exception:
+            with self.pools_lock:
+                stats['in_use'] -= 1
+            raise
+
+    def _release(self, db_path, conn):
+        # Сбрасываем настройки, которые вызывающий мог поменять
+        conn.row_factory = None
+
+        with self.pools_lock:
+            stats = self._get_stats(db_path)
+            stats['in_use'] -= 1
+            idle = self.idle.setdefault(db_path, [])
+            if len(idle) < self.MAX_IDLE:
+                idle.append(conn)
+                return
+            stats['closed'] += 1
+
+        conn.close()
+
+    def get_stats(self, db_path=None):
+        """Статистика соединений по каждой базе (или по одной)"""
+        with self.pools_lock:
+            result = {
+                path: {**stats, 'idle': len(self.idle.get(path, []))}
+                for path, stats in self.stats.items()
+            }
+        if db_path is not None:
+            return result.get(db_path, {})
+        return result
+
+    def close_all(self):
+        """Закрывает все свободные соединения"""
+        with self.pools_lock:
+            pools = list(self.idle.items())
+            self.idle = {}
+            for db_path, idle in pools:
+                self._get_stats(db_path)['closed'] += len(idle)
+
+        for _, idle in pools:
+            for conn in idle:
+                conn.close()
+
+
+# Синглтон экземпляр
+connection_manager = ConnectionManager()
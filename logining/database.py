@@ -4,14 +4,28 @@ import secrets
 from datetime import datetime, timedelta
 import threading
 import time
+from contextlib import contextmanager
 
-from .db_queue import queued_db_call
+from connection_manager import connection_manager
+from .db_queue import db_queue, queued_db_call, queued_db_read
+
+DB_PATH = 'users.db'
 
 
 class Database:
     _instance = None
     _lock = threading.Lock()
 
+    MAX_QUERY_PARAMS = 500
+    # Сколько секунд профиль из кэша считается актуальным
+    PROFILE_CACHE_TTL = 60
+    # Поля профиля для списков (без пароля и токена)
+    PROFILE_COLUMNS = ('uid', 'email', 'first_name', 'last_name', 'middle_name', 'department', 'locked')
+    # Сколько пользователей возвращает поиск
+    SEARCH_USERS_LIMIT = 20
+    # Триграммный индекс находит подстроки не короче трёх символов
+    TRIGRAM_MIN_LENGTH = 3
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
@@ -27,13 +41,64 @@ class Database:
         self._get_connection()
         self.create_tables()
 
+        # Кэш профилей: uid -> (время истечения, профиль или None)
+        self.profile_cache = {}
+        self.profile_cache_lock = threading.Lock()
+        # Растёт при каждом сбросе кэша: чтения, начатые до сброса, не кэшируются
+        self.profile_cache_generation = 0
+
+        # Записи, пришедшие почти одновременно, фиксируются одним коммитом
+        db_queue.set_group_commit(self._write_batch, self._write_item)
+
     def _get_connection(self):
         """Получает соединение для текущего потока"""
         if not hasattr(self.local, 'conn'):
-            self.local.conn = sqlite3.connect('users.db', timeout=30.0, check_same_thread=False)
+            # Потоки-читатели работают через соединения только для чтения
+            read_only = db_queue.is_reader_thread()
+            self.local.conn = connection_manager.connect(DB_PATH, read_only=read_only)
             self.local.cursor = self.local.conn.cursor()
         return self.local.conn, self.local.cursor
 
+    @contextmanager
+    def _write_batch(self):
+        """Транзакция для пакета записей из очереди"""
+        conn, cursor = self._get_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        self.local.in_batch = True
+        try:
+            yield
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.local.in_batch = False
+
+    @contextmanager
+    def _write_item(self):
+        """Точка сохранения для одной записи внутри пакета"""
+        conn, cursor = self._get_connection()
+        conn.execute('SAVEPOINT write_item')
+        try:
+            yield
+        except Exception:
+            conn.execute('ROLLBACK TO write_item')
+            raise
+        finally:
+            conn.execute('RELEASE write_item')
+
+    def _commit(self, conn):
+        """Фиксирует изменения, если запись не входит в пакет"""
+        if not getattr(self.local, 'in_batch', False):
+            conn.commit()
+
+    def _rollback(self, conn):
+        """Откатывает изменения текущей записи"""
+        if getattr(self.local, 'in_batch', False):
+            conn.execute('ROLLBACK TO write_item')
+        else:
+            conn.rollback()
+
     def create_tables(self):
         """Создает таблицы если их нет"""
         conn, cursor = self._get_connection()
@@ -55,6 +120,97 @@ class Database:
             )
         ''')
         conn.commit()
+        self._migrate(conn)
+        self.user_search_mode = self._detect_user_search_mode(conn)
+
+    # ---------- Миграции ----------
+
+    def _migrate(self, conn):
+        """Применяет миграции, номер последней хранится в PRAGMA user_version.
+
+        Миграция, вернувшая False, не засчитывается: она и следующие
+        повторятся при следующем запуске.
+        """
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+        for number, migration in enumerate(self.MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            if migration(self, conn) is False:
+                print(f"Миграция пользователей {number} ({migration.__name__}) отложена")
+                return
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+            print(f"Миграция пользователей {number} ({migration.__name__}) применена")
+
+    def _migration_user_search(self, conn):
+        """Поисковый индекс пользователей (FTS5), синхронизируемый триггерами.
+
+        Триграммы ищут подстроку в любом месте uid, email и ФИО; если
+        SQLite старше 3.34 и триграмм нет, индекс строится по словам
+        с поиском по началу слова.
+        """
+        for tokenizer in ('trigram', 'unicode61 remove_diacritics 2'):
+            try:
+                conn.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                        uid,
+                        email,
+                        first_name,
+                        last_name,
+                        content='users',
+                        content_rowid='id',
+                        tokenize='{tokenizer}'
+                    )
+                ''')
+                break
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Индекс поиска пользователей ({tokenizer}) недоступен: {e}")
+        else:
+            # SQLite собран без FTS5 — поиск пока на LIKE, индекс будет
+            # создан при запуске с SQLite, где FTS5 есть
+            return False
+
+        conn.executescript('''
+            CREATE TRIGGER IF NOT EXISTS trg_users_fts_insert
+            AFTER INSERT ON users
+            BEGIN
+                INSERT INTO users_fts (rowid, uid, email, first_name, last_name)
+                VALUES (NEW.id, NEW.uid, NEW.email, NEW.first_name, NEW.last_name);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_users_fts_delete
+            AFTER DELETE ON users
+            BEGIN
+                INSERT INTO users_fts (users_fts, rowid, uid, email, first_name, last_name)
+                VALUES ('delete', OLD.id, OLD.uid, OLD.email, OLD.first_name, OLD.last_name);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS trg_users_fts_update
+            AFTER UPDATE OF uid, email, first_name, last_name ON users
+            BEGIN
+                INSERT INTO users_fts (users_fts, rowid, uid, email, first_name, last_name)
+                VALUES ('delete', OLD.id, OLD.uid, OLD.email, OLD.first_name, OLD.last_name);
+                INSERT INTO users_fts (rowid, uid, email, first_name, last_name)
+                VALUES (NEW.id, NEW.uid, NEW.email, NEW.first_name, NEW.last_name);
+            END;
+        ''')
+        conn.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        conn.commit()
+
+    MIGRATIONS = [
+        _migration_user_search,
+    ]
+
+    @staticmethod
+    def _detect_user_search_mode(conn):
+        """'trigram', 'prefix' или None (индекса нет, поиск через LIKE)"""
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+        ).fetchone()
+        if not row:
+            return None
+        return 'trigram' if 'trigram' in row[0] else 'prefix'
 
     @queued_db_call
     def create_user(self, email, password, first_name="", last_name="", middle_name=""):
@@ -74,12 +230,12 @@ class Database:
                 INSERT INTO users (uid, email, password_hash, first_name, last_name, middle_name)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (uid, email, password_hash, first_name, last_name, middle_name))
-            conn.commit()
+            self._commit(conn)
             return uid
         except sqlite3.IntegrityError:
             return None
 
-    @queued_db_call
+    @queued_db_read
     def authenticate_user(self, email, password):
         """Аутентификация пользователя по email и паролю"""
         conn, cursor = self._get_connection()
@@ -95,7 +251,7 @@ class Database:
             return dict(zip(columns, user))
         return None
 
-    @queued_db_call
+    @queued_db_read
     def get_user_by_uid(self, uid):
         """Получает пользователя по UID"""
         conn, cursor = self._get_connection()
@@ -107,7 +263,7 @@ class Database:
             return dict(zip(columns, user))
         return None
 
-    @queued_db_call
+    @queued_db_read
     def get_user_by_email(self, email):
         """Получает пользователя по email"""
         conn, cursor = self._get_connection()
@@ -119,9 +275,75 @@ class Database:
             return dict(zip(columns, user))
         return None
 
-    @queued_db_call
+    @queued_db_read
+    def get_users_by_uids(self, uids):
+        """Получает профили нескольких пользователей одним запросом: {uid: профиль}"""
+        conn, cursor = self._get_connection()
+
+        uids = list(dict.fromkeys(uids))
+        columns = ', '.join(self.PROFILE_COLUMNS)
+        users = {}
+        # Ограничение SQLite на число параметров в одном запросе
+        for start in range(0, len(uids), self.MAX_QUERY_PARAMS):
+            chunk = uids[start:start + self.MAX_QUERY_PARAMS]
+            placeholders = ','.join('?' for _ in chunk)
+            cursor.execute(f'SELECT {columns} FROM users WHERE uid IN ({placeholders})', chunk)
+            for row in cursor.fetchall():
+                user = dict(zip(self.PROFILE_COLUMNS, row))
+                users[user['uid']] = user
+        return users
+
+    def get_profiles(self, uids):
+        """Профили пользователей через кэш: в базу уходят только отсутствующие.
+
+        Возвращает {uid: профиль или None}.
+        """
+        now = time.monotonic()
+        profiles = {}
+        missing = []
+
+        with self.profile_cache_lock:
+            generation = self.profile_cache_generation
+            for uid in uids:
+                cached = self.profile_cache.get(uid)
+                if cached and cached[0] > now:
+                    profiles[uid] = cached[1]
+                else:
+                    missing.append(uid)
+
+        if missing:
+            found = self.get_users_by_uids(missing)
+            expires_at = time.monotonic() + self.PROFILE_CACHE_TTL
+            with self.profile_cache_lock:
+                # Пока шло чтение, профиль могли изменить — такой ответ не кэшируем
+                cacheable = generation == self.profile_cache_generation
+                for uid in missing:
+                    profile = found.get(uid)
+                    # Отсутствующих тоже кэшируем, чтобы не спрашивать базу каждый раз
+                    if cacheable:
+                        self.profile_cache[uid] = (expires_at, profile)
+                    profiles[uid] = profile
+
+        return profiles
+
+    def invalidate_profile(self, uid=None):
+        """Сбрасывает профиль из кэша (или весь кэш)"""
+        with self.profile_cache_lock:
+            self.profile_cache_generation += 1
+            if uid is None:
+                self.profile_cache.clear()
+            else:
+                self.profile_cache.pop(uid, None)
+
     def update_user_profile(self, uid, first_name, last_name, middle_name, birth_date, department):
         """Обновляет профиль пользователя"""
+        updated = self._update_user_profile(uid, first_name, last_name, middle_name, birth_date, department)
+        # Сбрасываем после коммита, иначе читатель успел бы закэшировать старый профиль
+        self.invalidate_profile(uid)
+        return updated
+
+    @queued_db_call
+    def _update_user_profile(self, uid, first_name, last_name, middle_name, birth_date, department):
         conn, cursor = self._get_connection()
 
         cursor.execute('''
@@ -130,7 +352,7 @@ class Database:
                 birth_date = ?, department = ?
             WHERE uid = ? AND locked = 0
         ''', (first_name, last_name, middle_name, birth_date, department, uid))
-        conn.commit()
+        self._commit(conn)
         return cursor.rowcount > 0
 
     @queued_db_call
@@ -146,7 +368,7 @@ class Database:
             SET password_hash = ?
             WHERE uid = ? AND password_hash = ? AND locked = 0
         ''', (new_hash, uid, old_hash))
-        conn.commit()
+        self._commit(conn)
         return cursor.rowcount > 0
 
     @queued_db_call
@@ -163,19 +385,19 @@ class Database:
                 SET auth_token = ?, token_expiry = ?
                 WHERE uid = ?
             ''', (token, expiry, uid))
-            conn.commit()
+            self._commit(conn)
             return token
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e):
                 time.sleep(0.1)
                 try:
-                    conn.rollback()
+                    self._rollback(conn)
                     cursor.execute('''
                         UPDATE users 
                         SET auth_token = ?, token_expiry = ?
                         WHERE uid = ?
                     ''', (token, expiry, uid))
-                    conn.commit()
+                    self._commit(conn)
                     return token
                 except:
                     print("Warning: Could not save token to database")
@@ -183,7 +405,7 @@ class Database:
             else:
                 raise
 
-    @queued_db_call
+    @queued_db_read
     def validate_token(self, token):
         """Проверяет токен и возвращает пользователя если он валиден"""
         conn, cursor = self._get_connection()
@@ -210,15 +432,15 @@ class Database:
                 SET auth_token = NULL, token_expiry = NULL
                 WHERE uid = ?
             ''', (uid,))
-            conn.commit()
+            self._commit(conn)
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e):
                 print(f"Database locked during logout for UID: {uid}")
-                conn.rollback()
+                self._rollback(conn)
             else:
                 raise
 
-    @queued_db_call
+    @queued_db_read
     def get_user_locked_status(self, uid):
         """Проверяет заблокирован ли пользователь"""
         conn, cursor = self._get_connection()
@@ -227,53 +449,63 @@ class Database:
         result = cursor.fetchone()
         return result[0] if result else 0
 
-    @queued_db_call
-    def search_users(self, search_term, exclude_uid=None):
-        """Ищет пользователей по UID или email"""
+    @queued_db_read
+    def search_users(self, search_term, exclude_uid=None, limit=None):
+        """Ищет пользователей по UID, email, имени и фамилии.
+
+        Один запрос к поисковому индексу, лучшие совпадения первыми
+        (совпадение в uid и email весит больше, чем в имени).
+        """
         conn, cursor = self._get_connection()
+        limit = limit or self.SEARCH_USERS_LIMIT
 
-        # Ищем по UID
-        cursor.execute('''
-            SELECT uid, email, first_name, last_name 
-            FROM users 
-            WHERE uid LIKE ? AND uid != ?
-            LIMIT 10
-        ''', (f'%{search_term}%', exclude_uid or ''))
-        users_by_uid = cursor.fetchall()
+        match = self._user_fts_query(search_term)
+        if match:
+            cursor.execute('''
+                SELECT users.uid, users.email, users.first_name, users.last_name
+                FROM users_fts
+                JOIN users ON users.id = users_fts.rowid
+                WHERE users_fts MATCH ? AND users.uid != ?
+                ORDER BY bm25(users_fts, 4.0, 4.0, 1.0, 1.0)
+                LIMIT ?
+            ''', (match, exclude_uid or '', limit))
+        else:
+            # Нет индекса или слишком короткий запрос для триграмм
+            pattern = f'%{search_term.strip()}%'
+            cursor.execute('''
+                SELECT uid, email, first_name, last_name
+                FROM users
+                WHERE (uid LIKE ? OR email LIKE ? OR first_name LIKE ? OR last_name LIKE ?)
+                  AND uid != ?
+                LIMIT ?
+            ''', (pattern, pattern, pattern, pattern, exclude_uid or '', limit))
+
+        return [
+            {'uid': uid, 'email': email, 'name': self._display_name(first_name, last_name, email)}
+            for uid, email, first_name, last_name in cursor.fetchall()
+        ]
+
+    def _user_fts_query(self, search_term):
+        """Запрос пользователя -> выражение FTS5 (None — искать через LIKE)"""
+        if not self.user_search_mode:
+            return None
 
-        # Ищем по email
-        cursor.execute('''
-            SELECT uid, email, first_name, last_name 
-            FROM users 
-            WHERE email LIKE ? AND uid != ?
-            LIMIT 10
-        ''', (f'%{search_term}%', exclude_uid or ''))
-        users_by_email = cursor.fetchall()
-
-        # Объединяем результаты
-        user_dict = {}
-        for user in users_by_uid + users_by_email:
-            uid, email, first_name, last_name = user
-            if uid not in user_dict:
-                # Формируем имя
-                if first_name and last_name:
-                    name = f"{first_name} {last_name}"
-                elif first_name:
-                    name = first_name
-                elif last_name:
-                    name = last_name
-                else:
-                    name = email
+        terms = [term.replace('"', '""') for term in (search_term or '').split()]
+        if self.user_search_mode == 'trigram':
+            # Каждое слово ищется как подстрока; короткие слова индекс не находит
+            terms = [term for term in terms if len(term) >= self.TRIGRAM_MIN_LENGTH]
+            return ' '.join(f'"{term}"' for term in terms) or None
 
-                user_dict[uid] = {
-                    'uid': uid,
-                    'email': email,
-                    'name': name
-                }
+        return ' '.join(f'"{term}"*' for term in terms if term) or None
 
-        return list(user_dict.values())
+    @staticmethod
+    def _display_name(first_name, last_name, email):
+        """Имя для списков: имя и фамилия, если их нет — email"""
+        if first_name and last_name:
+            return f"{first_name} {last_name}"
+        return first_name or last_name or email
 
-    @queued_db_call
+    @queued_db_read
     def get_all_users_except(self, exclude_uid):
         """Получает всех пользователей кроме указанного"""
         conn, cursor = self._get_connection()
@@ -288,20 +520,10 @@ class Database:
         users = []
         for user in cursor.fetchall():
             uid, email, first_name, last_name = user
-
-            if first_name and last_name:
-                name = f"{first_name} {last_name}"
-            elif first_name:
-                name = first_name
-            elif last_name:
-                name = last_name
-            else:
-                name = email
-
             users.append({
                 'uid': uid,
                 'email': email,
-                'name': name
+                'name': self._display_name(first_name, last_name, email)
             })
 
         return users
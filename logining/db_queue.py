@@ -1,15 +1,26 @@
 import threading
 import queue
 import time
+from concurrent.futures import Future
 from functools import wraps
 
 
 class DatabaseQueue:
-    """Очередь запросов к базе данных для предотвращения блокировок"""
+    """Очередь запросов к базе данных для предотвращения блокировок.
+
+    Записи выполняются строго последовательно одним потоком-писателем,
+    чтения распределяются по ограниченному пулу потоков-читателей, у каждого
+    из которых своё соединение только для чтения.
+    """
 
     _instance = None
     _lock = threading.Lock()
 
+    READER_COUNT = 4
+    # Окно, в течение которого записи собираются в одну транзакцию
+    BATCH_WINDOW = 0.002
+    MAX_BATCH_SIZE = 64
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
@@ -19,58 +30,228 @@ class DatabaseQueue:
         return cls._instance
 
     def _init_queue(self):
-        """Инициализирует очередь"""
+        """Инициализирует очереди и потоки-обработчики"""
         self.request_queue = queue.Queue()
-        self.result_dict = {}
-        self.request_id = 0
-        self.lock = threading.Lock()
+        self.read_queue = queue.Queue()
+
+        # Обработчики групповой транзакции (см. set_group_commit)
+        self.batch_scope = None
+        self.item_scope = None
 
-        # Запускаем обработчик очереди в отдельном потоке
-        self.worker_thread = threading.Thread(target=self._process_queue, daemon=True)
+        # Счётчики для наблюдения за очередями
+        self.stats_lock = threading.Lock()
+        self.stats = {kind: self._empty_stats() for kind in ('read', 'write')}
+
+        # Запускаем писателя в отдельном потоке
+        self.worker_thread = threading.Thread(
+            target=self._process_write_queue,
+            name='db-writer',
+            daemon=True
+        )
         self.worker_thread.start()
 
-    def _process_queue(self):
+        # Запускаем пул читателей
+        self.reader_threads = []
+        for index in range(self.READER_COUNT):
+            reader = threading.Thread(
+                target=self._process_queue,
+                args=(self.read_queue, 'read'),
+                name=f'db-reader-{index}',
+                daemon=True
+            )
+            reader.start()
+            self.reader_threads.append(reader)
+
+    @staticmethod
+    def _empty_stats():
+        return {
+            'submitted': 0,
+            'batches': 0,
+            'completed': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0
+        }
+
+    def _process_queue(self, request_queue, kind):
         """Обрабатывает очередь запросов"""
         while True:
             try:
-                request_id, func, args, kwargs = self.request_queue.get()
+                future, func, args, kwargs, enqueued_at = request_queue.get()
 
                 try:
-                    # Выполняем функцию
-                    result = func(*args, **kwargs)
-                    self.result_dict[request_id] = (result, None)
-                except Exception as e:
-                    # Сохраняем ошибку
-                    self.result_dict[request_id] = (None, e)
+                    # Запрос мог быть отменён, пока ждал в очереди
+                    if future.set_running_or_notify_cancel():
+                        self._record_wait(kind, time.perf_counter() - enqueued_at)
+                        self._run(future, func, args, kwargs)
+                finally:
+                    request_queue.task_done()
 
-                self.request_queue.task_done()
+            except Exception as e:
+                print(f"Queue processor error: {e}")
+                time.sleep(0.1)
+
+    def _process_write_queue(self):
+        """Обрабатывает очередь записей, объединяя их в групповые транзакции"""
+        while True:
+            try:
+                batch, cancelled = self._collect_batch()
+
+                try:
+                    if self.batch_scope is None:
+                        for future, func, args, kwargs in batch:
+                            self._run(future, func, args, kwargs)
+                    else:
+                        self._run_batch(batch)
+                finally:
+                    for _ in range(len(batch) + cancelled):
+                        self.request_queue.task_done()
 
             except Exception as e:
                 print(f"Queue processor error: {e}")
                 time.sleep(0.1)
 
-    def enqueue(self, func, *args, **kwargs):
-        """Добавляет запрос в очередь и возвращает результат"""
-        with self.lock:
-            request_id = self.request_id
-            self.request_id += 1
+    def _collect_batch(self):
+        """Собирает записи, пришедшие в течение BATCH_WINDOW после первой"""
+        batch = []
+        cancelled = 0
+        deadline = None
+
+        while len(batch) < self.MAX_BATCH_SIZE:
+            if deadline is None:
+                item = self.request_queue.get()
+            else:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self.request_queue.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    break
+
+            future, func, args, kwargs, enqueued_at = item
+            # Запрос мог быть отменён, пока ждал в очереди
+            if not future.set_running_or_notify_cancel():
+                cancelled += 1
+                continue
+
+            self._record_wait('write', time.perf_counter() - enqueued_at)
+            batch.append((future, func, args, kwargs))
+            if deadline is None:
+                deadline = time.perf_counter() + self.BATCH_WINDOW
 
-        # Добавляем запрос в очередь
-        self.request_queue.put((request_id, func, args, kwargs))
+        with self.stats_lock:
+            self.stats['write']['batches'] += 1
+        return batch, cancelled
 
-        # Ждем результат
-        while request_id not in self.result_dict:
-            time.sleep(0.01)
+    def _run_batch(self, batch):
+        """Выполняет записи в одной транзакции.
 
-        result, error = self.result_dict.pop(request_id)
+        Каждая запись изолирована своей точкой сохранения: ошибка откатывает
+        только её изменения и возвращается её вызывающему. Результаты
+        отдаются только после успешного общего коммита.
+        """
+        outcomes = []
+        try:
+            with self.batch_scope():
+                for future, func, args, kwargs in batch:
+                    try:
+                        with self.item_scope():
+                            result = func(*args, **kwargs)
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                    else:
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # Коммит не удался — ни одна запись пакета не сохранена
+            for future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
 
-        if error:
-            raise error
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def set_group_commit(self, batch_scope, item_scope):
+        """Включает групповой коммит для очереди записей.
+
+        batch_scope() — контекстный менеджер транзакции всего пакета,
+        item_scope() — контекстный менеджер отдельной записи внутри пакета.
+        Оба вызываются в потоке-писателе.
+        """
+        self.batch_scope = batch_scope
+        self.item_scope = item_scope
+
+    @staticmethod
+    def _run(future, func, args, kwargs):
+        """Выполняет функцию и передаёт результат или ошибку в future"""
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def _record_wait(self, kind, wait):
+        with self.stats_lock:
+            stats = self.stats[kind]
+            stats['completed'] += 1
+            stats['total_wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+
+    def is_reader_thread(self):
+        """Выполняется ли текущий код в потоке-читателе"""
+        return threading.current_thread() in self.reader_threads
+
+    def submit(self, func, *args, read=False, **kwargs) -> Future:
+        """Ставит запрос в очередь и сразу возвращает Future с результатом.
+
+        Не блокирует вызывающий поток, поэтому подходит для UI: результат
+        можно получить через future.add_done_callback. При read=True запрос
+        уходит в пул читателей.
+        """
+        future = Future()
+        current = threading.current_thread()
+
+        # Вложенный вызов из самого обработчика выполняется сразу, иначе поток
+        # будет ждать сам себя. Писатель может читать через своё соединение,
+        # а читатель писать не может — запись уходит писателю.
+        if current is self.worker_thread or (read and self.is_reader_thread()):
+            if future.set_running_or_notify_cancel():
+                self._run(future, func, args, kwargs)
+            return future
+
+        kind = 'read' if read else 'write'
+        with self.stats_lock:
+            self.stats[kind]['submitted'] += 1
+
+        target_queue = self.read_queue if read else self.request_queue
+        target_queue.put((future, func, args, kwargs, time.perf_counter()))
+        return future
+
+    def enqueue(self, func, *args, read=False, **kwargs):
+        """Добавляет запрос в очередь и возвращает результат"""
+        # Поток просыпается сразу после завершения запроса, без опроса
+        return self.submit(func, *args, read=read, **kwargs).result()
+
+    def get_stats(self):
+        """Возвращает глубину очередей и время ожидания запросов"""
+        depths = {'read': self.read_queue.qsize(), 'write': self.request_queue.qsize()}
+        with self.stats_lock:
+            result = {}
+            for kind, stats in self.stats.items():
+                completed = stats['completed']
+                result[kind] = {
+                    **stats,
+                    'depth': depths[kind],
+                    'avg_wait': stats['total_wait'] / completed if completed else 0.0
+                }
         return result
 
     def close(self):
         """Закрывает очередь"""
         self.request_queue.join()
+        self.read_queue.join()
 
 
 # Синглтон экземпляр
@@ -85,4 +266,14 @@ def queued_db_call(func):
     def wrapper(*args, **kwargs):
         return db_queue.enqueue(func, *args, **kwargs)
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def queued_db_read(func):
+    """Декоратор для чтений: выполняются в пуле читателей параллельно с записью"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return db_queue.enqueue(func, *args, read=True, **kwargs)
+
+    return wrapper
@@ -3,6 +3,7 @@ from config import *
 from kivy.app import App
 from kivy.core.window import Window
 from main_layout import MainLayout
+from refresh_scheduler import RefreshScheduler
 
 
 class MyApp(App):
@@ -11,5 +12,13 @@ class MyApp(App):
         Window.borderless = True
         return MainLayout()
 
+    def on_pause(self):
+        # В фоне фоновые проверки баз не нужны
+        RefreshScheduler.pause_all('app')
+        return True
+
+    def on_resume(self):
+        RefreshScheduler.resume_all('app')
+
 if __name__ == "__main__":
     MyApp().run()
\ No newline at end of file
@@ -0,0 +1,242 @@
+import threading
+import time
+import weakref
+
+from kivy.clock import Clock
+from kivy.core.window import Window
+
+
+class RefreshScheduler:
+    """Адаптивное расписание фонового обновления.
+
+    Пока данные не меняются, интервал между проверками растёт в
+    BACKOFF_FACTOR раз до max_interval; после изменения или действия
+    пользователя сразу возвращается к min_interval. На паузе (окно
+    свёрнуто или приложение в фоне) проверки не выполняются; экраны
+    при уходе планировщик останавливают.
+
+    Работает в двух режимах:
+    - через Clock: start(callback), callback() вызывается в UI-потоке и
+      возвращает True, если данные изменились, или None, если проверка
+      ушла в фон — тогда её результат передаётся позже через report();
+    - в собственном потоке вызывающего: start(), затем цикл
+      `while scheduler.wait(): ...; scheduler.report(changed)`.
+    """
+
+    BACKOFF_FACTOR = 2
+
+    # Все планировщики, чтобы ставить их на паузу при сворачивании окна
+    # и уходе приложения в фон (MyApp.on_pause)
+    _instances = weakref.WeakSet()
+    _window_bound = False
+
+    def __init__(self, name, min_interval, max_interval, baseline_interval=None):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Интервал прежнего опроса с постоянной частотой — с ним сравнивается статистика
+        self.baseline_interval = baseline_interval or min_interval
+        self.interval = min_interval
+
+        self.condition = threading.Condition()
+        self.stopped = True
+        self.woken = False
+        self.pause_reasons = set()
+
+        # Режим Clock
+        self.callback = None
+        self.clock_event = None
+        self.awaiting_report = False
+
+        # Статистика
+        self.wakeups = 0
+        self.changes = 0
+        self.elapsed = 0.0
+        self.started_at = None
+
+        RefreshScheduler._instances.add(self)
+        self._bind_window()
+
+    @classmethod
+    def _bind_window(cls):
+        """Подписка на сворачивание окна (один раз на все планировщики)"""
+        if cls._window_bound:
+            return
+        Window.bind(on_minimize=lambda *args: cls.pause_all('window'),
+                    on_restore=lambda *args: cls.resume_all('window'))
+        cls._window_bound = True
+
+    @classmethod
+    def pause_all(cls, reason):
+        """Пауза всех планировщиков приложения"""
+        for scheduler in list(cls._instances):
+            scheduler.pause(reason)
+
+    @classmethod
+    def resume_all(cls, reason):
+        """Снять паузу со всех планировщиков приложения"""
+        for scheduler in list(cls._instances):
+            scheduler.resume(reason)
+
+    @property
+    def paused(self):
+        return bool(self.pause_reasons)
+
+    # ---------- Управление ----------
+
+    def start(self, callback=None):
+        """Запуск с быстрым интервалом"""
+        with self.condition:
+            self.stopped = False
+            self.woken = False
+            self.interval = self.min_interval
+            self.started_at = time.monotonic()
+            self.callback = callback
+            self.awaiting_report = False
+        self._schedule_tick(self.interval)
+
+    def stop(self):
+        """Остановка; ждущий поток сразу получает False из wait()"""
+        with self.condition:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.elapsed += time.monotonic() - self.started_at
+            self.started_at = None
+            self.condition.notify_all()
+        self._cancel_tick()
+
+        stats = self.get_stats()
+        print(f"⏹ Обновление '{self.name}': проверок {stats['wakeups']}, "
+              f"сэкономлено пробуждений {stats['saved_wakeups']}")
+
+    def pause(self, reason):
+        """Приостановить проверки (причины паузы независимы)"""
+        with self.condition:
+            self.pause_reasons.add(reason)
+        self._cancel_tick()
+
+    def resume(self, reason):
+        """Снять паузу; за время паузы данные могли измениться — проверяем сразу"""
+        with self.condition:
+            if reason not in self.pause_reasons:
+                return
+            self.pause_reasons.discard(reason)
+            if self.paused or self.stopped:
+                return
+            self.woken = True
+            self.interval = self.min_interval
+            self.condition.notify_all()
+        self._schedule_tick(0)
+
+    def activity(self):
+        """Действие пользователя: вернуться к быстрому интервалу"""
+        with self.condition:
+            self.interval = self.min_interval
+            if self.stopped:
+                return
+            self.condition.notify_all()
+        self._schedule_tick(self.interval)
+
+    def wake(self):
+        """Известно, что данные изменились: проверить сразу"""
+        with self.condition:
+            self.interval = self.min_interval
+            if self.stopped:
+                return
+            self.woken = True
+            self.condition.notify_all()
+        self._schedule_tick(0)
+
+    def report(self, changed):
+        """Результат проверки: изменение сбрасывает интервал, иначе он растёт"""
+        with self.condition:
+            if changed:
+                self.changes += 1
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.BACKOFF_FACTOR, self.max_interval)
+            awaiting = self.awaiting_report
+            self.awaiting_report = False
+
+        # Фоновая проверка завершилась — планируем следующую
+        if awaiting:
+            self._schedule_tick(self.interval)
+
+    # ---------- Режим потока ----------
+
+    def wait(self):
+        """Ждёт следующей проверки. Возвращает False после stop()"""
+        with self.condition:
+            started = time.monotonic()
+            while not self.stopped:
+                if not self.paused:
+                    if self.woken:
+                        break
+                    # Интервал мог сократиться, пока поток ждал
+                    remaining = started + self.interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                else:
+                    self.condition.wait()
+
+            if self.stopped:
+                return False
+            self.woken = False
+            self.wakeups += 1
+            return True
+
+    # ---------- Режим Clock ----------
+
+    def _schedule_tick(self, delay):
+        if self.callback is None:
+            return
+        self._cancel_tick()
+        if self.stopped or self.paused:
+            return
+        self.clock_event = Clock.schedule_once(self._tick, delay)
+
+    def _cancel_tick(self):
+        if self.clock_event is not None:
+            self.clock_event.cancel()
+            self.clock_event = None
+
+    def _tick(self, dt):
+        self.clock_event = None
+        if self.stopped or self.paused:
+            return
+
+        self.woken = False
+        self.wakeups += 1
+        try:
+            changed = self.callback()
+        except Exception as e:
+            print(f"❌ Ошибка обновления '{self.name}': {e}")
+            changed = False
+
+        if changed is None:
+            # Проверка идёт в фоне, следующий запуск — после report()
+            self.awaiting_report = True
+            return
+
+        self.report(changed)
+        self._schedule_tick(self.interval)
+
+    # ---------- Статистика ----------
+
+    def get_stats(self):
+        """Сколько проверок выполнено и сколько сэкономлено по сравнению
+        с прежним опросом каждые baseline_interval секунд"""
+        with self.condition:
+            elapsed = self.elapsed
+            if self.started_at is not None:
+                elapsed += time.monotonic() - self.started_at
+            fixed_rate_wakeups = int(elapsed / self.baseline_interval)
+            return {
+                'wakeups': self.wakeups,
+                'changes': self.changes,
+                'interval': self.interval,
+                'paused': self.paused,
+                'saved_wakeups': max(fixed_rate_wakeups - self.wakeups, 0)
+            }
@@ -1,7 +1,9 @@
 # send/database.py
-import sqlite3
 from datetime import datetime
 
+from change_notifier import change_notifier
+from connection_manager import connection_manager
+
 
 class RequestDatabase:
     """Класс для работы с базой данных заявок"""
@@ -12,46 +14,40 @@ class RequestDatabase:
 
     def init_database(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS applications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                department TEXT NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT NOT NULL,
-                days INTEGER NOT NULL,
-                difficulty INTEGER DEFAULT 1,
-                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'new'
-            )
-        ''')
-
-        existing_columns = {
-            column[1] for column in cursor.execute('PRAGMA table_info(applications)').fetchall()
-        }
-
-        if 'difficulty' not in existing_columns:
-            cursor.execute('ALTER TABLE applications ADD COLUMN difficulty INTEGER DEFAULT 1')
+        with connection_manager.connection(self.db_path) as conn:
+            cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS applications (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    department TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    days INTEGER NOT NULL,
+                    difficulty INTEGER DEFAULT 1,
+                    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    status TEXT DEFAULT 'new'
+                )
+            ''')
+
+            existing_columns = {
+                column[1] for column in cursor.execute('PRAGMA table_info(applications)').fetchall()
+            }
+
+            if 'difficulty' not in existing_columns:
+                cursor.execute('ALTER TABLE applications ADD COLUMN difficulty INTEGER DEFAULT 1')
 
     def save_request(self, department, title, description, days, difficulty):
         """Сохранение заявки в базу данных"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT INTO applications 
-                (department, title, description, days, difficulty)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (department, title, description, days, difficulty))
-
-            conn.commit()
-            conn.close()
+            with connection_manager.connection(self.db_path) as conn:
+                conn.execute('''
+                    INSERT INTO applications 
+                    (department, title, description, days, difficulty)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (department, title, description, days, difficulty))
+            # После коммита: новая заявка сразу появится у открытых списков задач
+            change_notifier.bump(self.db_path)
             return True
         except Exception as e:
             print(f"Ошибка при сохранении в БД: {e}")
@@ -59,14 +55,9 @@ class RequestDatabase:
 
     def get_all_requests(self):
         """Получение всех заявок (для будущего расширения)"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT * FROM applications 
-            ORDER BY created_date DESC
-        ''')
-
-        requests = cursor.fetchall()
-        conn.close()
-        return requests
+        with connection_manager.connection(self.db_path) as conn:
+            cursor = conn.execute('''
+                SELECT * FROM applications 
+                ORDER BY created_date DESC
+            ''')
+            return cursor.fetchall()
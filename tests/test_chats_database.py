@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from chats.database import ChatsDatabase
+
+
+@pytest.fixture
+def source(tmp_path):
+    db = ChatsDatabase(str(tmp_path / 'source.db'))
+    chat_id = db.create_or_get_chat('alice', 'bob')
+    db.add_message(chat_id, 'alice', 'привет')
+    db.add_message(chat_id, 'bob', 'привет, как дела?')
+    db.add_message(chat_id, 'alice', 'хорошо')
+    db.add_message(chat_id, 'alice', 'а у тебя?')
+    return db
+
+
+@pytest.fixture
+def target(tmp_path):
+    return ChatsDatabase(str(tmp_path / 'target.db'))
+
+
+def unread(db, uid):
+    return db.get_unread_counts(uid)
+
+
+def test_import_copies_messages_and_unread(source, target):
+    target.import_jsonl(source.export_jsonl())
+
+    assert target.get_chat_messages(1) == source.get_chat_messages(1)
+    for uid in ('alice', 'bob'):
+        assert unread(target, uid) == unread(source, uid)
+
+
+def test_interrupted_import_resumes(source, target):
+    lines = list(source.export_jsonl())
+
+    # Обрыв после первых сообщений
+    assert target.import_jsonl(lines[:-2], batch_size=1) == 2
+    assert target.import_position(source.database_id()) == 2
+
+    assert target.import_jsonl(lines, batch_size=1) == 2
+    assert target.get_chat_messages(1) == source.get_chat_messages(1)
+    for uid in ('alice', 'bob'):
+        assert unread(target, uid) == unread(source, uid)
+
+
+def test_incremental_import_updates_unread(source, target):
+    target.import_jsonl(source.export_jsonl())
+    target.mark_chat_read(1, 'bob')
+
+    source.add_message(1, 'alice', 'ты тут?')
+    source.add_message(1, 'bob', 'да')
+    source.add_message(1, 'alice', 'отлично')
+    position = target.import_position(source.database_id())
+    assert target.import_jsonl(source.export_jsonl(after_message_id=position)) == 3
+
+    assert unread(target, 'bob') == {1: 1}
+    assert unread(target, 'alice') == {}
+    assert target.get_user_chats('bob')[0]['unread_count'] == 1
+
+
+def test_import_refuses_foreign_database(source, tmp_path):
+    other = ChatsDatabase(str(tmp_path / 'other.db'))
+    chat_id = other.create_or_get_chat('carol', 'dave')
+    other.add_message(chat_id, 'carol', 'hi')
+
+    with pytest.raises(ValueError):
+        other.import_jsonl(source.export_jsonl())
+    assert [m['text'] for m in other.get_chat_messages(chat_id)] == ['hi']
+
+
+def test_search_index_backfills_existing_messages(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    # База из версии без поиска: только исходные таблицы
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE chats (
+            chat_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid1 TEXT NOT NULL, uid2 TEXT NOT NULL, last_message_time TEXT,
+            UNIQUE(uid1, uid2)
+        );
+        CREATE TABLE messages (
+            message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER, sender_uid TEXT NOT NULL,
+            message_text TEXT NOT NULL, timestamp TEXT NOT NULL
+        );
+        INSERT INTO chats (uid1, uid2) VALUES ('alice', 'bob');
+        INSERT INTO messages (chat_id, sender_uid, message_text, timestamp)
+        VALUES (1, 'alice', 'старое сообщение', '2024-01-01T10:00:00');
+    ''')
+    conn.close()
+
+    db = ChatsDatabase(path)
+    assert not db.search_index_ready()
+    db.add_message(1, 'bob', 'новое сообщение')
+    assert [m['id'] for m in db.search_messages('alice', 'сообщение')] == [2]
+
+    db.backfill_search_index()
+
+    assert db.search_index_ready()
+    assert {m['id'] for m in db.search_messages('alice', 'сообщение')} == {1, 2}
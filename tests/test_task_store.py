@@ -0,0 +1,47 @@
+import pytest
+
+from applications.task_store import TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TaskStore(
+        db_name=str(tmp_path / 'applications.db'),
+        legacy_assigned_db=str(tmp_path / 'assigned_tasks.db')
+    )
+
+
+def query_plan(store, after=None, limit=None):
+    query, params = store._open_tasks_query('IT', after, limit)
+    with store._get_connection() as conn:
+        return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+
+
+@pytest.mark.parametrize('after', [None, ('2024-01-01 00:00:00', 10)])
+@pytest.mark.parametrize('limit', [None, 20])
+def test_open_feed_uses_partial_index(store, after, limit):
+    plan = query_plan(store, after, limit)
+
+    assert any('idx_applications_open_feed' in step for step in plan), plan
+    assert not any('USE TEMP B-TREE' in step for step in plan), plan
+
+
+def test_open_feed_pages_in_order(store):
+    with store._get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO applications (department, title, description, days, created_date, status)
+            VALUES (?, ?, ?, 1, ?, ?)
+        ''', [
+            ('IT', 'a', '', '2024-01-01 10:00:00', 'new'),
+            ('IT', 'b', '', '2024-01-02 10:00:00', 'new'),
+            ('IT', 'c', '', '2024-01-02 10:00:00', 'new'),
+            ('IT', 'd', '', '2024-01-03 10:00:00', 'completed'),
+            ('HR', 'e', '', '2024-01-04 10:00:00', 'new'),
+        ])
+        conn.commit()
+
+    first = store.get_open_tasks('IT', limit=2)
+    cursor = (first[-1]['created_date'], first[-1]['id'])
+    rest = store.get_open_tasks('IT', after=cursor)
+
+    assert [task['title'] for task in first + rest] == ['c', 'b', 'a']